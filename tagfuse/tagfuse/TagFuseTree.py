@@ -25,8 +25,17 @@ if (os.path.exists(basedir)
             sys.path.insert(0,ndir)
 
 from taghandlers import *
+from blockcache  import BlockCache
+from dblkmirror  import DblkMirror
+from radioutils  import tag_node_id
 
-def TagFuseFileTree(radio):
+def TagFuseFileTree(radio, mirror_dir=None):
+    # radio is the RadioScheduler the handlers queue radio exchanges to
+    # shared by the append-only files, dblk and panic
+    if (mirror_dir):
+        cache = DblkMirror(mirror_dir, tag_node_id)
+    else:
+        cache = BlockCache()
     return PollNetDirHandler(radio, OrderedDict([
         ('',                       FileHandler(S_IFDIR, 0o751, 3)),
         ('<node_id:ffffffffffff>', DirHandler(OrderedDict([
@@ -44,7 +53,7 @@ def TagFuseFileTree(radio):
                             ('',     FileHandler(S_IFDIR, 0o751, 4)),
                             ('byte',   DirHandler(OrderedDict([
                                 ('',     FileHandler(S_IFDIR, 0o751, 3)),
-                                ('0',    ByteIOFileHandler(radio, S_IFREG, 0o220, 1)),
+                                ('0',    ByteIOFileHandler(radio, S_IFREG, 0o220, 1, cache)),
                             ]))),
                             ('note',    DblkIONoteHandler(radio, S_IFREG, 0o220, 1)),
                             ('.recnum',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
@@ -55,38 +64,38 @@ def TagFuseFileTree(radio):
                             ('',    FileHandler(S_IFDIR, 0o751, 4)),
                             ('byte',DirHandler(OrderedDict([
                                 ('',    FileHandler(S_IFDIR, 0o751, 35)),
-                                ('0',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('1',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('2',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('3',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('4',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('5',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('6',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('7',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('8',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('9',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('10',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('11',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('12',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('13',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('14',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('15',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('16',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('17',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('18',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('19',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('20',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('21',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('22',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('23',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('24',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('25',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('26',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('27',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('28',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('29',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('30',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
-                                ('31',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1)),
+                                ('0',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('1',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('2',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('3',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('4',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('5',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('6',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('7',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('8',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('9',   ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('10',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('11',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('12',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('13',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('14',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('15',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('16',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('17',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('18',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('19',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('20',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('21',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('22',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('23',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('24',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('25',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('26',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('27',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('28',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('29',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('30',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
+                                ('31',  ByteIOFileHandler(radio, S_IFREG, 0o444, 1, cache)),
                             ]))),
                         ]))),
                     ]))),
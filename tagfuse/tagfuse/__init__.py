@@ -25,5 +25,8 @@ if (os.path.exists(basedir)
 from radioutils  import *
 from radioimage  import *
 from radiofile   import *
+from radiosched  import *
+from blockcache  import *
+from dblkmirror  import *
 from taghandlers import *
 from TagFuseTree import TagFuseFileTree
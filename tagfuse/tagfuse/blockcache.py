@@ -0,0 +1,150 @@
+from __future__ import print_function, absolute_import, division
+
+import threading
+import unittest
+from collections import OrderedDict
+
+__all__ = ['BlockCache',
+           'BLOCK_SIZE',
+           'CACHE_BUDGET',
+]
+
+BLOCK_SIZE          = 512             # same as the fuse max_read
+CACHE_BUDGET        = 4 * 1024 * 1024 # bytes of block data kept
+
+class BlockCache(object):
+    '''
+    Block Read Cache class
+
+    Caches the data of append-only byte files (dblk, panic) in fixed
+    size blocks, keyed by (path, block number). Only complete blocks
+    are kept, the tail of a file may still grow. The least recently
+    used blocks are dropped when the data held exceeds budget bytes.
+    Safe to use from several threads, the lock is not held while
+    blocks are fetched.
+    '''
+    def __init__(self, block_size=BLOCK_SIZE, budget=CACHE_BUDGET):
+        self.block_size = block_size
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        try:
+            data = self._blocks.pop(key)
+        except KeyError:
+            return None
+        self._blocks[key] = data        # most recently used
+        return data
+
+    def _put(self, key, data):
+        old = self._blocks.pop(key, None)
+        if (old is not None):
+            self.used -= len(old)
+        self._blocks[key] = data
+        self.used += len(data)
+        while (self.used > self.budget):
+            k, v = self._blocks.popitem(last=False)
+            self.used -= len(v)
+
+    def read(self, path_list, size, offset, fetch):
+        '''
+        Read size bytes at offset, fetching blocks not in the cache
+
+        fetch(size, offset) returns (buf, eof) like file_get_bytes and
+        is called once for each run of missing blocks. Returns (buf,
+        eof), buf stops short at the first block that came back
+        incomplete. Whole blocks are fetched, eof is only passed on
+        when the data asked for came back short.
+        '''
+        bs = self.block_size
+        path = tuple(path_list)
+        first = offset // bs
+        last = (offset + size - 1) // bs
+        accum_bytes = bytearray()
+        eof = False
+        blk = first
+        while (blk <= last):
+            with self._lock:
+                data = self._get((path, blk))
+                if (data is not None):
+                    self.hits += 1
+                else:
+                    # fetch up to the next block already cached
+                    end = blk + 1
+                    while (end <= last) and ((path, end) not in self._blocks):
+                        end += 1
+                    self.misses += end - blk
+            if (data is not None):
+                accum_bytes += data
+                blk += 1
+                continue
+            want = (end - blk) * bs
+            buf, eof = fetch(want, blk * bs)
+            with self._lock:
+                for i in range(len(buf) // bs):
+                    self._put((path, blk + i), bytes(buf[i * bs:(i + 1) * bs]))
+            accum_bytes += buf
+            if (eof) or (len(buf) < want):
+                break
+            blk = end
+        start = offset - first * bs
+        buf = accum_bytes[start:start + size]
+        return buf, (eof) and (len(buf) < size)
+
+    def invalidate(self, path_list=None):
+        '''
+        drop the blocks of path_list, or all blocks if None
+        '''
+        with self._lock:
+            if (path_list is None):
+                self._blocks.clear()
+                self.used = 0
+                return
+            path = tuple(path_list)
+            for k in [k for k in self._blocks if (k[0] == path)]:
+                self.used -= len(self._blocks.pop(k))
+
+    def __len__(self):
+        return len(self._blocks)
+
+#------------ end of class definition ---------------------
+
+class TestBlockCache(unittest.TestCase):
+    def setUp(self):
+        self.data = bytearray(range(256)) * 2 + bytearray(188)   # 700 bytes
+        self.fetches = []
+        self.cache = BlockCache(budget=4 * BLOCK_SIZE)
+
+    def fetch(self, size, offset):
+        self.fetches.append((size, offset))
+        buf = self.data[offset:offset + size]
+        return buf, (offset + size > len(self.data))
+
+    def test_read_blocks(self):
+        buf, eof = self.cache.read(['f'], 100, 10, self.fetch)
+        self.assertEqual((buf, eof), (self.data[10:110], False))
+        buf, eof = self.cache.read(['f'], 50, 200, self.fetch)
+        self.assertEqual(buf, self.data[200:250])
+        self.assertEqual(self.fetches, [(BLOCK_SIZE, 0)])
+
+    def test_read_tail(self):
+        buf, eof = self.cache.read(['f'], 100, 512, self.fetch)
+        self.assertEqual((buf, eof), (self.data[512:612], False))
+        buf, eof = self.cache.read(['f'], 188, 512, self.fetch)
+        self.assertEqual((buf, eof), (self.data[512:700], False))
+        buf, eof = self.cache.read(['f'], 100, 650, self.fetch)
+        self.assertEqual((buf, eof), (self.data[650:700], True))
+        self.assertEqual(len(self.cache), 0)    # partial block not kept
+
+    def test_invalidate(self):
+        self.cache.read(['f'], 10, 0, self.fetch)
+        self.cache.invalidate(['f'])
+        self.cache.read(['f'], 10, 0, self.fetch)
+        self.assertEqual(len(self.fetches), 2)
+
+if __name__ == '__main__':
+    unittest.main()
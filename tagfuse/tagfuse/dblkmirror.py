@@ -0,0 +1,327 @@
+from __future__ import print_function, absolute_import, division
+
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+__all__ = ['DblkMirror',
+           'CHECK_SIZE',
+]
+
+CHECK_SIZE          = 512             # leading bytes compared with the tag
+
+class MirrorFile(object):
+    '''
+    Mirror File class
+
+    A sparse local copy of one tag file plus a range map of the
+    extents already present. The data file is written at the file
+    offset of the data, the map is saved next to it (name + '.map')
+    as json: a sorted list of [start, end) extents and the length and
+    sha1 of the leading bytes of the file, used to tell whether the
+    mirror still matches the tag. put() only writes the data, sync()
+    makes it durable and then saves the map that claims it, replacing
+    the map by renaming a synced temp file, so a crash can only lose
+    extents.
+    '''
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.map_path = data_path + '.map'
+        mode = 'r+b' if os.path.exists(data_path) else 'w+b'
+        self._f = open(data_path, mode)
+        self._mm = None
+        self.ranges = []
+        self.head = None                # [length, sha1] of leading bytes
+        self.checked = False            # compared with the tag this run
+        self._sync_lock = threading.Lock()
+        self._load_map()
+
+    def _load_map(self):
+        try:
+            with open(self.map_path) as f:
+                saved = json.load(f)
+            ranges, head = saved['ranges'], saved['head']
+        except (IOError, ValueError, KeyError, TypeError):
+            return                      # no map, or from an older layout
+        size = os.fstat(self._f.fileno()).st_size
+        self.ranges = [[s, min(e, size)] for s, e in ranges if (s < size)]
+        self.head = head
+
+    def _save_map(self, ranges, head):
+        tmp = self.map_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'ranges': ranges, 'head': head}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self.map_path)
+
+    def _add_range(self, start, end):
+        merged = []
+        for s, e in self.ranges:
+            if (e < start) or (s > end):
+                merged.append([s, e])
+            else:
+                start, end = min(s, start), max(e, end)
+        merged.append([start, end])
+        merged.sort()
+        self.ranges = merged
+
+    def extents(self, start, end):
+        '''
+        split [start, end) into (start, end, present) pieces
+        '''
+        pos = start
+        for s, e in self.ranges:
+            if (e <= pos):
+                continue
+            if (s >= end):
+                break
+            if (s > pos):
+                yield pos, s, False
+            yield max(s, pos), min(e, end), True
+            pos = min(e, end)
+        if (pos < end):
+            yield pos, end, False
+
+    def get(self, start, end):
+        '''
+        bytes of [start, end), which must be present
+        '''
+        if (self._mm is None) or (len(self._mm) < end):
+            if (self._mm is not None):
+                self._mm.close()
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm[start:end]
+
+    def check(self, lead):
+        '''
+        Compare lead, the leading bytes of the file read from the tag,
+        with those the mirror was made from. Clears the mirror when the
+        tag holds different data (another tag, a reformatted card) or a
+        mirror without a recorded head. Returns True if it matched.
+        '''
+        self.checked = True
+        matched = True
+        if (self.head is None):
+            matched = not self.ranges
+        else:
+            length, digest = self.head
+            matched = (len(lead) >= length) and \
+                (hashlib.sha1(bytes(lead[:length])).hexdigest() == digest)
+        if (not matched):
+            self.clear()
+        if (self.head is None) or (len(lead) > self.head[0]):
+            self.head = [len(lead), hashlib.sha1(bytes(lead)).hexdigest()]
+        return matched
+
+    def put(self, start, buf):
+        if (not buf):
+            return
+        self._f.seek(start)
+        self._f.write(buf)
+        self._f.flush()
+        self._add_range(start, start + len(buf))
+
+    def sync(self):
+        '''
+        sync the data put so far, then save the map that claims it
+        '''
+        with self._sync_lock:
+            ranges, head = self.ranges, self.head   # replaced, never updated
+            os.fsync(self._f.fileno())
+            self._save_map(ranges, head)
+
+    def clear(self):
+        if (self._mm is not None):
+            self._mm.close()
+            self._mm = None
+        self._f.truncate(0)
+        self.ranges = []
+        self.head = None
+        with self._sync_lock:
+            self._save_map(self.ranges, self.head)
+
+#------------ end of class definition ---------------------
+
+class DblkMirror(object):
+    '''
+    Persistent Dblk Mirror class
+
+    Backs append-only tag files (dblk, panic) with local mirror files
+    that survive restarts, one directory per tag node_id under root.
+    Reads of ranges already fetched come from the mirror, only the
+    gaps are read over the radio. Same read() interface as BlockCache.
+
+    node_id(path_list) returns the node id of the tag that answers
+    path_list (see radioutils.tag_node_id), or None if it is not known;
+    reads then go straight to the tag. It is only called until it
+    gives a node id for the head of the path, which is then kept, so
+    reads served from the mirror do not wait on the radio. The first
+    read of each mirror compares its leading CHECK_SIZE bytes with the
+    tag before any data is served from it, until the tag answers that
+    read reads go straight to the tag.
+
+    Safe to use from several threads, the lock is not held while gaps
+    are fetched or while the mirror is synced, once per read.
+    '''
+    def __init__(self, root, node_id):
+        self.root = root
+        self.node_id = node_id
+        self.hits = 0
+        self.misses = 0
+        self._files = {}
+        self._nodes = {}                # path head -> node id, once known
+        self._lock = threading.Lock()
+
+    def _file_path(self, node, path_list):
+        node_dir = os.path.join(self.root, node)
+        if not os.path.isdir(node_dir):
+            os.makedirs(node_dir)
+        return os.path.join(node_dir, '_'.join(map(str, path_list[1:])))
+
+    def _node(self, path_list):
+        head = path_list[0]
+        node = self._nodes.get(head)
+        if (node is None):
+            node = self.node_id(path_list)
+            if (node is not None):
+                self._nodes[head] = node
+        return node
+
+    def mirror(self, node, path_list):
+        key = (node, tuple(path_list))
+        try:
+            return self._files[key]
+        except KeyError:
+            mf = MirrorFile(self._file_path(node, path_list))
+            self._files[key] = mf
+            return mf
+
+    def read(self, path_list, size, offset, fetch):
+        '''
+        Read size bytes at offset, fetching the gaps in the mirror
+
+        fetch(size, offset) returns (buf, eof) like file_get_bytes and
+        is called once per gap. Returns (buf, eof), buf stops short at
+        the first gap that came back incomplete.
+        '''
+        node = self._node(path_list)
+        if (node is None):
+            return fetch(size, offset)
+        with self._lock:
+            mf = self.mirror(node, path_list)
+            checked = mf.checked
+        if (not checked):
+            lead, eof = fetch(CHECK_SIZE, 0)
+            if (len(lead) < CHECK_SIZE) and (not eof):
+                return fetch(size, offset)      # tag did not answer, check later
+            with self._lock:
+                if (not mf.checked):
+                    if not mf.check(lead):
+                        print('mirror does not match tag, cleared:', mf.data_path)
+                    mf.put(0, lead)
+            mf.sync()
+        with self._lock:
+            extents = list(mf.extents(offset, offset + size))
+        accum_bytes = bytearray()
+        eof = False
+        fetched = False
+        for start, end, present in extents:
+            if (present):
+                with self._lock:
+                    self.hits += 1
+                    accum_bytes += mf.get(start, end)
+                continue
+            with self._lock:
+                self.misses += 1
+            buf, eof = fetch(end - start, start)
+            with self._lock:
+                mf.put(start, buf)
+            fetched = True
+            accum_bytes += buf
+            if (eof) or (len(buf) < end - start):
+                break
+        if (fetched):
+            mf.sync()
+        return accum_bytes, eof
+
+    def invalidate(self, path_list=None):
+        '''
+        forget the mirrored data of path_list, or of every open mirror
+        if None
+        '''
+        with self._lock:
+            for key, mf in self._files.items():
+                if (path_list is None) or (key[1] == tuple(path_list)):
+                    mf.clear()
+
+#------------ end of class definition ---------------------
+
+class TestDblkMirror(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.data = bytearray(range(256)) * 5 + bytearray(220)    # 1500 bytes
+        self.fetches = []
+        self.answer = True
+        self.mirror = self.new_mirror()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def new_mirror(self):
+        return DblkMirror(self.root, lambda path_list: '1fa3b2c4d5e6')
+
+    def fetch(self, size, offset):
+        self.fetches.append((size, offset))
+        if (not self.answer):
+            return bytearray(), False
+        buf = self.data[offset:offset + size]
+        return buf, (offset + size > len(self.data))
+
+    def read(self, size, offset, mirror=None):
+        return (mirror or self.mirror).read(['dblk', '0'], size, offset, self.fetch)
+
+    def test_read_gaps(self):
+        self.assertEqual(self.read(100, 1000), (self.data[1000:1100], False))
+        self.assertEqual(self.read(200, 950), (self.data[950:1150], False))
+        self.assertEqual(self.fetches,
+                         [(CHECK_SIZE, 0), (100, 1000), (50, 950), (50, 1100)])
+        self.assertEqual(self.read(300, 100), (self.data[100:400], False))
+        self.assertEqual(len(self.fetches), 4)
+
+    def test_persist(self):
+        self.read(100, 1000)
+        self.fetches = []
+        mirror = self.new_mirror()
+        self.assertEqual(self.read(100, 1000, mirror), (self.data[1000:1100], False))
+        self.assertEqual(self.fetches, [(CHECK_SIZE, 0)])
+
+    def test_tag_changed(self):
+        self.read(100, 1000)
+        self.data = bytearray(reversed(self.data))
+        self.fetches = []
+        mirror = self.new_mirror()
+        self.assertEqual(self.read(100, 1000, mirror), (self.data[1000:1100], False))
+        self.assertEqual(self.fetches, [(CHECK_SIZE, 0), (100, 1000)])
+
+    def test_read_tail(self):
+        self.assertEqual(self.read(100, 1450), (self.data[1450:1500], True))
+        self.fetches = []
+        self.assertEqual(self.read(50, 1450), (self.data[1450:1500], False))
+        self.assertEqual(self.fetches, [])
+
+    def test_no_answer(self):
+        self.answer = False
+        self.assertEqual(self.read(100, 1000), (bytearray(), False))
+        self.answer = True
+        self.assertEqual(self.read(100, 1000), (self.data[1000:1100], False))
+        self.assertEqual(self.fetches,
+                         [(CHECK_SIZE, 0), (100, 1000), (CHECK_SIZE, 0), (100, 1000)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ from builtins import *                  # python3 types
 __all__ = ['file_get_bytes',
            'file_put_bytes',
            'file_update_attrs',
+           'files_update_attrs',
            'dblk_put_note']
 
 import os
@@ -32,9 +33,10 @@ if (os.path.exists(basedir)
             sys.path.insert(0,ndir)
     # zzz print '\n'.join(sys.path)
 
-from radioutils import payload2values, path2tlvs, path2list
+from radioutils import payload2values, path2tlvs, path2list, path2prefix
 #from radioutils import radio_send_msg, radio_receive_msg
-from radioutils import msg_exchange
+from radioutils import msg_exchange, msg_exchange_many
+from radioutils import transfer_sizer, tag_node_id
 
 from tagnet import TagMessage, TagGet, TagPut, TagHead
 from tagnet import TagName
@@ -48,31 +50,39 @@ from tagnet import TlvListBadException, TlvBadException
 #MAX_RETRIES         = 10
 #RADIO_POWER         = 100
 #SHORT_DELAY         = .02
+READ_TRIES          = 3
+
+def _file_bytes_msg(path_list, amount_to_get, file_offset):
+    # / <node_id> / "tag" / "sd" / 0 / devname / byte [/ fileno]
+    # path is encoded once, each chunk only adds its offset and size
+    prefix = path2prefix(path_list)
+    tname = prefix.extend(TagTlv(tlv_types.OFFSET, file_offset),
+                          TagTlv(tlv_types.SIZE, amount_to_get))
+    # zzz print(tname)
+    return TagGet(tname)
 
 def file_get_bytes(radio, path_list, amount_to_get, file_offset):
     '''
     File Byte Data Transfer function
+
+    Stop and wait, one GET at a time; the radio is half duplex and
+    flushes its fifo on every send, so only one request can be in
+    flight. The size asked for in each GET is set by the TransferSizer
+    of the tag, a GET that is not answered is sent again (at a smaller
+    size if the sizer adapts). Returns (buf, eof), buf comes back short without
+    eof when the tag stopped answering.
     '''
     accum_bytes = bytearray()
     eof = False
-
-    def _file_bytes_msg(path_list, amount_to_get, file_offset):
-        # / <node_id> / "tag" / "sd" / 0 / devname / byte [/ fileno]
-        tlv_list = path2tlvs(path_list)
-        tlv_list.extend([TagTlv(tlv_types.OFFSET, file_offset),
-                         TagTlv(tlv_types.SIZE, amount_to_get)])
-        tname = TagName(tlv_list)
-        # zzz
-        print(tname)
-        return TagGet(tname)
-
-    accum_bytes = bytearray()
-    tries = 3
+    sizer = transfer_sizer(path_list)
+    tries = READ_TRIES
     while (amount_to_get) and (tries):
-        req_msg = _file_bytes_msg(path_list, amount_to_get, file_offset)
+        amt_asked = sizer.limit(amount_to_get)
+        req_msg = _file_bytes_msg(path_list, amt_asked, file_offset)
         # zzz print(req_msg.name)
-        err, payload = msg_exchange(radio, req_msg)
+        err, payload = msg_exchange(radio, req_msg, sizer, tries=1)
         if (err == tlv_errors.SUCCESS):
+            tries = READ_TRIES
             offset, amt2get, block = payload2values(payload,
                                                     [tlv_types.OFFSET,
                                                      tlv_types.SIZE,
@@ -83,6 +93,7 @@ def file_get_bytes(radio, path_list, amount_to_get, file_offset):
                 accum_bytes   += block
                 file_offset   += len(block)
                 amount_to_get -= len(block)
+                amt_asked     -= len(block)
             if (eof):
                 print('eof: {}'.format(offset))
                 break
@@ -90,41 +101,30 @@ def file_get_bytes(radio, path_list, amount_to_get, file_offset):
                 print('bad offset, expected: {}, got: {}'.format(
                     file_offset, offset))
                 break
-            if (amt2get) and (amt2get != amount_to_get):
+            if (amt2get) and (amt2get != amt_asked):
                 print('bad size, expected: {}, got: {}'.format(
-                    amount_to_get, amt2get))
+                    amt_asked, amt2get))
                 break
         elif (err == tlv_errors.EBUSY):
             # zzz print('busy')
             continue
         elif (err == tlv_errors.EODATA):
-            print('end of file, offset: {}'.format(offset))
+            print('end of file, offset: {}'.format(file_offset))
             eof = True
             break
+        elif (err == tlv_errors.ETIMEOUT) or (err == tlv_errors.ERETRY):
+            tries -= 1
         else:
-            print('unexpected error: {}, offset: {}'.format(err, offset))
+            print('unexpected error: {}, offset: {}'.format(err, file_offset))
             break
     # zzz
     print('read p/l:{}/{}'.format(file_offset-len(accum_bytes), len(accum_bytes)))
     return accum_bytes, eof
 
-def file_update_attrs(radio, path_list, attrs):
+def _attrs_from_rsp(err, payload, attrs):
     '''
-    Retrieve current attributes of a file from remote tag
+    Fill in file size and time attributes from a HEAD response
     '''
-
-    def _file_attr_msg(path_list):
-        tname = TagName(path2tlvs(path_list))
-        # zzz print('file update attrs', path_list, tname)
-        return TagHead(tname)
-
-    req_msg = _file_attr_msg(path_list)
-    if (req_msg == None):
-        print('file_attr bad request msg')
-        return attrs
-    # zzz
-    print(req_msg.name)
-    err, payload = msg_exchange(radio, req_msg)
     if (err == tlv_errors.SUCCESS):
         this_time = time()
         print(payload)
@@ -143,6 +143,42 @@ def file_update_attrs(radio, path_list, attrs):
     attrs['st_mtime'] = this_time
     return attrs
 
+def _file_attr_msg(path_list):
+    tname = TagName(path2tlvs(path_list))
+    # zzz print('file update attrs', path_list, tname)
+    return TagHead(tname)
+
+def file_update_attrs(radio, path_list, attrs):
+    '''
+    Retrieve current attributes of a file from remote tag
+
+    attrs is updated in place, returns the error of the request.
+    '''
+    req_msg = _file_attr_msg(path_list)
+    if (req_msg == None):
+        print('file_attr bad request msg')
+        return tlv_errors.EINVAL
+    # zzz
+    print(req_msg.name)
+    err, payload = msg_exchange(radio, req_msg)
+    _attrs_from_rsp(err, payload, attrs)
+    return err
+
+def files_update_attrs(radio, path_lists, attrs_list):
+    '''
+    Retrieve current attributes of several files from remote tag
+
+    The HEAD requests are bundled, several per radio round trip. Each
+    attrs in attrs_list is updated in place, returns the error of each
+    request.
+    '''
+    reqs = [_file_attr_msg(path_list) for path_list in path_lists]
+    node = tag_node_id(path_lists[0]) if (path_lists) else None
+    results = msg_exchange_many(radio, reqs, node)
+    for (err, payload), attrs in zip(results, attrs_list):
+        _attrs_from_rsp(err, payload, attrs)
+    return [err for err, payload in results]
+
 def _put_bytes(radio, tname, buf, offset):
 
     def _file_put_msg(tname, buf, offset):
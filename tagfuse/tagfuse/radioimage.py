@@ -35,8 +35,8 @@ if (os.path.exists(basedir)
             sys.path.insert(0,ndir)
     # zzz print '\n'.join(sys.path)
 
-from radioutils import path2tlvs, radio_show_config
-from radioutils import msg_exchange
+from radioutils import path2tlvs, path2prefix, radio_show_config
+from radioutils import msg_exchange, transfer_sizer
 
 from tagnet import TagMessage, TagGet, TagPut, TagHead, TagDelete
 from tagnet import TagName
@@ -69,36 +69,50 @@ def show_radio_config(radio, config):
 def im_put_file(radio, path_list, buf, offset):
     '''
     Write data to an image file on the Tag
+
+    The name prefix is encoded once for the whole file and each chunk
+    is sliced from a view of buf, so only the chunk itself is copied.
+    Chunks fill the message, up to the size set by the TransferSizer
+    of the tag, a chunk that is not answered is sent again (at a
+    smaller size if the sizer adapts).
     '''
-    def _put_msg(path_list, buf, offset=None):
-        tlv_list = path2tlvs(path_list)
+    prefix = path2prefix(path_list)
+    sizer = transfer_sizer(path_list)
+    mv = memoryview(buf)
+
+    def _put_msg(start, offset=None):
         if (offset):
-            tlv_list.append(TagTlv(tlv_types.OFFSET,
-                                   offset))
-        tname = TagName(tlv_list)
+            tname = prefix.extend(TagTlv(tlv_types.OFFSET, offset))
+        else:
+            tname = prefix.extend()
         msg = TagPut(tname)
-        msg.payload = bytearray(buf[0:msg.payload_avail()])
+        msg.payload = bytearray(mv[start:start+sizer.limit(msg.payload_avail())])
         return (msg, len(msg.payload))
 
     amt_to_put = len(buf)
+    tries = 3
     while (amt_to_put):
-        req_msg, amt_accepted = _put_msg(path_list,
-                                         buf[(len(buf)-amt_to_put):],
-                                         offset)
+        req_msg, amt_accepted = _put_msg(len(buf)-amt_to_put, offset)
         print('im put', req_msg.name)
         error, payload = msg_exchange(radio,
-                                     req_msg)
+                                     req_msg,
+                                     sizer,
+                                     tries=1)
         print(error, payload)
-        if ((error is not tlv_errors.SUCCESS) or
-            (error is tlv_errors,ERETRY)):
+        if (error is tlv_errors.ETIMEOUT) or (error is tlv_errors.ERETRY):
+            tries -= 1
+            if (tries):
+                continue
+        if (error is not tlv_errors.SUCCESS):
             break
+        tries = 3
         if (payload[0].tlv_type() is tlv_types.OFFSET):
             prev_offset = offset
             offset = payload[0].value()
-            amount_to_put -= offset - prev_offset
+            amt_to_put -= offset - prev_offset
         else:
             offset += amt_accepted
-            amount_to_put -= amt_accepted
+            amt_to_put -= amt_accepted
 
     return error, offset
 
@@ -110,7 +124,7 @@ def im_get_dir(radio, path_list, version=None):
     Get Image Directory
 
     Returns a list of tuples containing a directory
-    name and current state.
+    name and current state, or None if the request failed.
     '''
     # zzz print('im_get_dir',path_list)
 
@@ -139,6 +153,9 @@ def im_get_dir(radio, path_list, version=None):
                 elif (state == 'n'): state = 'NIB'
                 elif (state == 'v'): state = 'valid'
                 rtn_list.append((version, state))
+    else:
+        print('im get dir, error: {}'.format(error))
+        return None
     return rtn_list
 
 def im_close_file(radio, path_list):
@@ -0,0 +1,119 @@
+from __future__ import print_function, absolute_import, division
+
+import itertools
+import sys
+import threading
+
+from errno import EIO
+
+from fuse import FuseOSError
+from six import reraise
+from six.moves.queue import PriorityQueue
+
+__all__ = ['RadioScheduler',
+           'PRIO_META',
+           'PRIO_BULK',
+           'CALL_TIMEOUT',
+]
+
+PRIO_META           = 0      # attributes, directories, create/delete
+PRIO_BULK           = 1      # file data reads and writes
+CALL_TIMEOUT        = 60.0   # seconds call() waits, queued time included
+
+class RadioTask(object):
+    '''
+    one radio request waiting for, or run by, the scheduler thread
+
+    A task cancelled before it started is skipped by the scheduler.
+    '''
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+        self.started = False
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        '''
+        cancel the task if it has not started, returns True if it was
+        '''
+        with self._lock:
+            self.cancelled = not self.started
+        return self.cancelled
+
+    def run(self, radio):
+        with self._lock:
+            if (self.cancelled):
+                return
+            self.started = True
+        try:
+            self.result = self.fn(radio, *self.args)
+        except BaseException:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.done.set()
+
+#------------ end of class definition ---------------------
+
+class RadioScheduler(object):
+    '''
+    Radio Request Scheduler class
+
+    Owns the radio. All radio exchanges are queued with call() and
+    run one at a time by the scheduler thread, lowest priority value
+    first and in arrival order within a priority, so attribute and
+    directory requests go ahead of queued bulk data transfers.
+    Operations served from the tagfuse caches never reach the queue
+    and do not wait on the radio.
+    '''
+    def __init__(self, radio):
+        self.radio = radio
+        self._queue = PriorityQueue()
+        self._seq = itertools.count()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='radio')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''
+        stop the scheduler thread once the requests queued are done
+        '''
+        if (self._thread):
+            self._queue.put((sys.maxsize, next(self._seq), None))
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while (True):
+            prio, seq, task = self._queue.get()
+            if (task is None):
+                break
+            task.run(self.radio)
+
+    def call(self, prio, fn, *args):
+        '''
+        Run fn(radio, *args) on the scheduler thread and return its
+        result, exceptions raised by fn are raised here. Raises EIO if
+        fn has not finished within CALL_TIMEOUT seconds. fn is then
+        cancelled if it has not started, else its result is dropped.
+        '''
+        if (self._thread is None) or \
+           (threading.current_thread() is self._thread):
+            return fn(self.radio, *args)
+        task = RadioTask(fn, args)
+        self._queue.put((prio, next(self._seq), task))
+        if (not task.done.wait(CALL_TIMEOUT)):
+            print('radio call timed out: {}, {}'.format(
+                fn.__name__, 'cancelled' if task.cancel() else 'running'))
+            raise FuseOSError(EIO)
+        if (task.exc_info):
+            reraise(*task.exc_info)
+        return task.result
+
+#------------ end of class definition ---------------------
@@ -12,7 +12,13 @@ UNIT_TESTING = False
 __all__ = ['name2version',
            'payload2values',
            'msg_exchange',
+           'msg_exchange_many',
+           'TransferSizer',
+           'transfer_sizer',
+           'tag_node_id',
            'path2tlvs',
+           'path2prefix',
+           'path_cache_invalidate',
            'path2list',
            'radio_start',
            'radio_config',
@@ -27,6 +33,9 @@ __all__ = ['name2version',
 
 import sys
 import os
+import re
+import threading
+from collections import OrderedDict
 
 from datetime import datetime, timedelta
 from time import sleep
@@ -54,7 +63,8 @@ from si446x import Si446xRadio
 from si446x import clr_pend_int_s, radio_config_cmd_ids, radio_config_group_ids
 
 from tagnet import TagTlv, TagTlvList, tlv_types, tlv_errors
-from tagnet import TagMessage
+from tagnet import TagNamePrefix
+from tagnet import TagMessage, TagBundle
 from tagnet import TlvListBadException, TlvBadException
 
 clr_all_flags = clr_pend_int_s.parse('\00' * clr_pend_int_s.sizeof())
@@ -68,6 +78,10 @@ MAX_PAYLOAD         = 254
 MAX_RETRIES         = 10
 RADIO_POWER         = 10     # must be low value to work with 4463
 SHORT_DELAY         = .02
+PATH_CACHE_SIZE     = 256    # paths with their tlvs kept by path2tlvs
+SIZE_ADAPT          = False  # TransferSizer adapts the transfer size (tagfuse --adapt-size)
+SIZE_MIN            = 32     # smallest transfer size an adapting TransferSizer uses
+SIZE_STEP           = 16     # bytes an adapting TransferSizer adds per clean exchange
 
 def name2version(name):
     '''
@@ -77,26 +91,32 @@ def name2version(name):
 
 def payload2values(payload, keynames):
     '''
-    Extract all parameters in payload and then filter for the
-    parameters of interest.
+    Extract the parameters of interest from the payload.
+
+    Returns, for each type in keynames, the value of the first tlv of
+    that type (the next one, when a type is named again), or None.
+    The payload is walked once, only matched tlvs are decoded.
 
     Remove any matched parameters from the payload.
     '''
-    plist = []
-    # zzz print('keynames', keynames)
-    for match_key in keynames:
-        item = None
-        for tlv in payload:
-            if match_key == tlv.tlv_type():
-                item = tlv.value()
-                payload.remove(tlv)
+    wanted = {}
+    for i, key in enumerate(keynames):
+        wanted.setdefault(key, []).append(i)
+    plist = [None] * len(keynames)
+    used = []
+    for n, tlv in enumerate(payload):
+        slots = wanted.get(tlv.tlv_type())
+        if (slots):
+            plist[slots.pop(0)] = tlv.value()
+            used.append(n)
+            if (len(used) == len(keynames)):
                 break
-            # zzz print('for tlv', match_key, tlv, plist)
-        plist.append(item)
+    for n in reversed(used):
+        del payload[n]
     # zzz print('plist', plist)
     return (plist)
 
-def path2tlvs(path_list):
+def _path2tlvs(path_list):
     '''
     Convert a list of individual elements in a path into
     a list of Tag Tlvs
@@ -130,21 +150,181 @@ def path2tlvs(path_list):
             tlist.append(t)
     return tlist
 
+class PathCache(object):
+    '''
+    Bounded LRU of path tuple -> (tlvs, encoded name prefix)
+
+    Holds the result of converting each recently used path, so a hot
+    path is converted (and encoded) once. The least recently used path
+    is dropped when the cache is full. Safe to use from several
+    threads.
+    '''
+    def __init__(self, size=PATH_CACHE_SIZE):
+        self.size = size
+        self._paths = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, path_list):
+        key = tuple(path_list)
+        with self._lock:
+            try:
+                entry = self._paths.pop(key)
+                self.hits += 1
+            except KeyError:
+                tlvs = _path2tlvs(path_list)
+                entry = (tlvs, TagNamePrefix(tlvs))
+                self.misses += 1
+                if (len(self._paths) >= self.size):
+                    self._paths.popitem(last=False)
+            self._paths[key] = entry    # most recently used
+        return entry
+
+    def invalidate(self, path_list=None):
+        '''
+        drop path_list and every path below it, or all paths if None
+        '''
+        with self._lock:
+            if (path_list is None):
+                self._paths.clear()
+                return
+            key = tuple(path_list)
+            for k in [k for k in self._paths if (k[:len(key)] == key)]:
+                del self._paths[k]
+
+    def __len__(self):
+        return len(self._paths)
+
+_path_cache = PathCache()
+
+def path2tlvs(path_list):
+    '''
+    Convert a list of individual elements in a path into
+    a list of Tag Tlvs
+
+    Served from the path cache, the tlvs in the list are shared with
+    other callers and must not be updated in place.
+    '''
+    return list(_path_cache.lookup(path_list)[0])
+
+def path2prefix(path_list):
+    '''
+    Return the path as a pre-encoded name prefix (see TagNamePrefix)
+    '''
+    return _path_cache.lookup(path_list)[1]
+
+def path_cache_invalidate(path_list=None):
+    '''
+    Forget cached conversions of a path and the paths below it, called
+    when the file tree changes
+    '''
+    _path_cache.invalidate(path_list)
+
 def path2list(path):
     path = os.path.abspath(os.path.realpath(path))
     return path.split('/')[1:]
 
 
-def msg_exchange(radio, req):
+class TransferSizer(object):
+    '''
+    Transfer size for the radio link to one tag
+
+    Fixed at max_size unless adapt (default SIZE_ADAPT). An adapting
+    sizer (AIMD) also starts at max_size, halves the data size per
+    request, down to min_size, after each timeout and grows it back by
+    step after each clean exchange. Adapting has not beaten the fixed
+    size in tagfuse.test.bench_read yet, so it is off by default.
+    '''
+    def __init__(self, max_size=MAX_PAYLOAD, min_size=SIZE_MIN, step=SIZE_STEP,
+                 adapt=None):
+        self.max_size = max_size
+        self.min_size = min_size
+        self.step = step
+        self.adapt = SIZE_ADAPT if (adapt is None) else adapt
+        self.size = max_size
+        self.exchanges = 0
+        self.failures = 0
+
+    def limit(self, amount):
+        '''
+        amount capped to the current transfer size
+        '''
+        return min(amount, self.size)
+
+    def clean(self):
+        self.exchanges += 1
+        if (self.adapt):
+            self.size = min(self.size + self.step, self.max_size)
+
+    def failed(self):
+        self.exchanges += 1
+        self.failures += 1
+        if (self.adapt):
+            self.size = max(self.size // 2, self.min_size)
+
+    def __repr__(self):
+        return 'TransferSizer(size={}, exchanges={}, failures={})'.format(
+            self.size, self.exchanges, self.failures)
+
+_sizers = {}
+
+def transfer_sizer(path_list):
+    '''
+    Return the TransferSizer of the tag that answers path_list
+
+    Kept by the node id in path_list (see tag_node_id), or by the head
+    of path_list if it names none.
+    '''
+    key = tag_node_id(path_list) or str(path_list[0])
+    try:
+        return _sizers[key]
+    except KeyError:
+        return _sizers.setdefault(key, TransferSizer())
+
+def tag_node_id(path_list):
+    '''
+    Node id (lower case hex string) named by the head of path_list,
+    '<node_id:1fa3b2c4d5e6>', or None if it names none
+
+    Taken from the path, no radio traffic. The tree names the tag in
+    range by the broadcast node id.
+    '''
+    m = re.match(r'<node_id:([0-9a-fA-F]+)>$', str(path_list[0]))
+    return m.group(1).lower() if (m) else None
+
+def _rsp_result(rsp):
+    '''
+    return (error, payload) of a response message
+
+    checks the first tlv on the wire, the payload is only decoded
+    on success.
+    '''
+    error = tlv_errors.ERETRY
+    payload = None
+    first = next(rsp.payload_views(), None)
+    if (first is not None):
+        if (first.tlv_type() is tlv_types.ERROR):
+            error = first.value()
+        else:
+            error = tlv_errors.SUCCESS
+        if (error is tlv_errors.SUCCESS):
+            payload = rsp.payload
+            if (first.tlv_type() is tlv_types.ERROR):
+                del payload[0]
+    return error, payload
+
+def msg_exchange(radio, req, sizer=None, tries=3):
     '''
     Send a TagNet request msg and wait for a response.
 
-    checks for error in response and will retry three times
+    checks for error in response and will retry (tries times in all)
     if request was not successful.
     Timeouts on the transmit will also be counted as an error
     and reported appropriately.
+
+    Each try is reported to sizer (a TransferSizer), if given.
     '''
-    tries = 3
     req_msg = req.build()
     # zzz print(len(req_msg),hexlify(req_msg))
     while (tries):
@@ -154,24 +334,74 @@ def msg_exchange(radio, req):
         rsp_buf, rssi, status = radio_receive_msg(radio, MAX_RECV, MAX_WAIT)
         if (rsp_buf):
             # zzz print(len(rsp_buf),hexlify(rsp_buf))
-            rsp = TagMessage(bytearray(rsp_buf))
-            if (rsp.payload):
-                # zzz print(rsp.payload)
-                if (rsp.payload[0].tlv_type() is tlv_types.ERROR):
-                    error = rsp.payload[0].value()
-                    del rsp.payload[0]
-                else:
-                    error = tlv_errors.SUCCESS
-                if (error is tlv_errors.SUCCESS):
-                    payload = rsp.payload
-                    tries = 1
+            error, payload = _rsp_result(TagMessage(bytearray(rsp_buf)))
+            if (error is tlv_errors.SUCCESS):
+                tries = 1
             # zzz print('msg_exchange, tries: ', tries)
         else:
             error = tlv_errors.ETIMEOUT
             print('msg_exchange: timeout')
+        if (sizer):
+            _size_report(sizer, error)
         tries -= 1
     return error, payload
 
+def _size_report(sizer, error):
+    if (error is tlv_errors.SUCCESS):
+        sizer.clean()
+    elif (error is tlv_errors.ETIMEOUT):
+        sizer.failed()
+
+_no_bundles = set()             # node ids of tags that do not handle bundles
+
+def msg_exchange_many(radio, reqs, node=None):
+    '''
+    Send several TagNet requests, packed into as few frames as possible.
+
+    Consecutive requests are carried in a TagBundle, one radio round
+    trip per bundle. The responses are split back out of the response
+    bundle. Returns a list with the (error, payload) msg_exchange would
+    have returned for each request, in request order.
+
+    A request that is not answered in the response bundle (the tag ran
+    out of room, or does not handle bundles) is sent again on its own.
+    A bundle is tried once. If it times out the tag is taken to be out
+    of range, and it and all the requests after it are returned as
+    ETIMEOUT. When the tag answers it with an error, or without any
+    responses, node (the node id of the tag) is marked as not handling
+    bundles and its requests are sent one at a time from then on.
+    '''
+    if (node is not None) and (node in _no_bundles):
+        return [msg_exchange(radio, req) for req in reqs]
+    results = []
+    i = 0
+    while (i < len(reqs)):
+        bundle = TagBundle()
+        while (i + len(bundle) < len(reqs)) and bundle.add(reqs[i + len(bundle)]):
+            pass
+        batch = reqs[i:i + max(len(bundle), 1)]
+        i += len(batch)
+        if (len(batch) == 1):
+            results.append(msg_exchange(radio, batch[0]))
+            continue
+        error, payload = msg_exchange(radio, bundle, tries=1)
+        if (error is tlv_errors.ETIMEOUT):
+            return results + [(error, None)] * (len(reqs) - len(results))
+        rsps = []
+        if (error is tlv_errors.SUCCESS):
+            rsps = [TagMessage(tlv.value()) for tlv in payload
+                    if (tlv.tlv_type() is tlv_types.BLOCK)]
+        if (node is not None) and (not rsps):
+            print('msg_exchange_many: no bundles, node: {}'.format(node))
+            _no_bundles.add(node)
+            return results + [msg_exchange(radio, req) for req in reqs[i - len(batch):]]
+        for n, req in enumerate(batch):
+            if (n < len(rsps)) and (rsps[n].name_key() == req.name_key()):
+                results.append(_rsp_result(rsps[n]))
+            else:
+                results.append(msg_exchange(radio, req))
+    return results
+
 def radio_config(radio):
     '''
     Configure Si446x Radio
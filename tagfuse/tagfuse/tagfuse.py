@@ -29,7 +29,10 @@ if (os.path.exists(basedir)
             sys.path.insert(0,ndir)
     # zzz print '\n'.join(sys.path)
 
-from radioutils  import radio_start
+import radioutils
+from radioutils  import radio_start, path_cache_invalidate
+from radiosched  import RadioScheduler
+import taghandlers
 from taghandlers import *
 from TagFuseTree import TagFuseFileTree
 
@@ -47,24 +50,49 @@ class TagFuse(LoggingMixIn, Operations):
       buf = os.read(f, 10)
       os.lseek(f, fpos, 0)
       fpos = os.lseek(f, 0, 1)  # returns current file position
+
+    Fuse operations run on several threads. The radio is owned by a
+    RadioScheduler thread, handlers queue their radio exchanges to it
+    and operations served from the caches do not wait on the radio.
     '''
-    def __init__(self):
+    def __init__(self, mirror_dir=None):
+        self.mirror_dir = mirror_dir
         self.create_count = 0
         self.open_count = 0
         self.start = time()
         self.radio = None
+        self.scheduler = None
         self.tag_tree =  None
+        self.node_index = {}
         # zzz print(self.tag_tree)
 
     def path2list(self, path):
         path = os.path.abspath(os.path.realpath(path))
         return path.split('/')[1:]
 
+    def IndexTree(self):
+        '''
+        Index every handler in the tree by its fuse path
+        '''
+        self.node_index = dict(self.tag_tree.walk())
+        self.node_index['/'] = self.tag_tree
+
     def LocateNode(self, path):
-        if (path == '/'):
-            print('located root')
-            return self.tag_tree
-        return self.tag_tree.traverse(self.path2list(path), 0)
+        '''
+        Return the handler for path
+
+        Looked up in the path index, a path not in the index (e.g. an
+        image found by readdir since) is found by walking the tree and
+        then added.
+        '''
+        try:
+            return self.node_index[path]
+        except KeyError:
+            pass
+        handler = self.tag_tree.traverse(self.path2list(path), 0)
+        if (handler is not None):
+            self.node_index[path] = handler
+        return handler
 
     def DeleteNode(self, path, node):
         pass
@@ -82,6 +110,7 @@ class TagFuse(LoggingMixIn, Operations):
         print(base, name, handler)
         # try:
         if handler.create(self.path2list(path), mode, name):
+            path_cache_invalidate(self.path2list(path))
             return 0
         # except:
         #    raise FuseOSError(ENOENT)
@@ -90,6 +119,8 @@ class TagFuse(LoggingMixIn, Operations):
 
     def destroy(self, path):
         print('tagfuse destroy')
+        if (self.scheduler):
+            self.scheduler.stop()
         return None
 
     def fsync(self, path, datasync, fip):
@@ -100,8 +131,19 @@ class TagFuse(LoggingMixIn, Operations):
 
     def getattr(self, path, fh=None):
         handler = self.LocateNode(path)
+        path_list = self.path2list(path)
+        update = True
+        if isinstance(handler, FileHandler) and (handler.attrs_stale()):
+            # first miss in the directory, read all its due attrs at once
+            parent = self.LocateNode(os.path.dirname(path))
+            if isinstance(parent, DirHandler):
+                try:
+                    parent.refresh_attrs(path_list[:-1])
+                    update = False
+                except EnvironmentError as e:
+                    print('getattr prefetch failed: {}'.format(e))
         try:
-            return handler.getattr(self.path2list(path), update=True)
+            return handler.getattr(path_list, update=update)
         except AttributeError:
             raise FuseOSError(ENOENT)
 
@@ -115,7 +157,10 @@ class TagFuse(LoggingMixIn, Operations):
 
     def init(self, path):
         self.radio = radio_start()
-        self.tag_tree = TagFuseFileTree(self.radio)
+        self.scheduler = RadioScheduler(self.radio)
+        self.scheduler.start()
+        self.tag_tree = TagFuseFileTree(self.scheduler, self.mirror_dir)
+        self.IndexTree()
         return None
 
     def listxattr(self, path):
@@ -212,6 +257,8 @@ class TagFuse(LoggingMixIn, Operations):
             if (handler.unlink(self.path2list(path))):
                 dirhandler = self.LocateNode(base)
                 dirhandler.unlink(self.path2list(path))
+                path_cache_invalidate(self.path2list(path))
+                self.node_index.pop(path, None)
         except:
             raise FuseOSError(ENOENT)
 
@@ -245,7 +292,7 @@ class TagFuse(LoggingMixIn, Operations):
         try:
             base, name = os.path.split(path)
             ret_val = handler.release(self.path2list(path))
-            dhandler = self.LocateNode(self.path2list(base))
+            dhandler = self.LocateNode(base)
             dhandler.release(self.path2list(path))
             return ret_val
         except:
@@ -264,10 +311,13 @@ def TagStorage(args):
                'kernel_cache':  True,
                'direct_io':     True,
     }
+    radioutils.SIZE_ADAPT = args.adapt_size
+    taghandlers.ATTR_TTL = args.attr_ttl
+    taghandlers.DIR_TTL = args.dir_ttl
     # zzz logging.basicConfig(level=logging.INFO)
     # zzz
     logging.basicConfig(level=logging.DEBUG) # output FUSE related debug info
-    fuse = FUSE(TagFuse(), args.mountpoint, nothreads=True, raw_fi=True, foreground=True, **options)
+    fuse = FUSE(TagFuse(args.mirror), args.mountpoint, nothreads=False, raw_fi=True, foreground=True, **options)
 
 if __name__ == '__main__':
     import tagfuseargs
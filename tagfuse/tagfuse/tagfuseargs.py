@@ -25,6 +25,20 @@ def parseargs():
     parser.add_argument('-V', '--version',
                         action='version',
                         version='%(prog)s ' + VERSION)
+    parser.add_argument('--mirror',
+                        default=None,
+                        help='directory for local mirrors of tag dblk and panic data')
+    parser.add_argument('--adapt-size',
+                        action='store_true',
+                        help='adapt the radio transfer size to the link (default fixed)')
+    parser.add_argument('--attr-ttl',
+                        type=float,
+                        default=5.0,
+                        help='seconds file attributes read from the tag are reused')
+    parser.add_argument('--dir-ttl',
+                        type=float,
+                        default=10.0,
+                        help='seconds an image directory listing is reused')
     # 0v print errors
     # v  also print entr/exit info
     # vv also print execution info
@@ -6,12 +6,15 @@ import os
 import sys
 
 import logging
+import threading
 
 from   collections   import defaultdict, OrderedDict
-from   errno         import ENOENT, ENODATA, EEXIST
+from   errno         import ENOENT, ENODATA, EEXIST, EIO
 from   stat          import S_IFDIR, S_IFLNK, S_IFREG
 from   time          import time
 
+from   fuse          import FuseOSError
+
 __all__ = ['FileHandler',
            'ByteIOFileHandler',
            'ImageIOFileHandler',
@@ -45,7 +48,14 @@ if (os.path.exists(basedir)
     # zzz print('\n'.join(sys.path))
 
 from radiofile   import file_get_bytes, file_put_bytes, file_update_attrs, dblk_put_note
+from radiofile   import files_update_attrs
 from radioimage  import im_get_dir, im_put_file, im_get_file, im_delete_file, im_close_file
+from radiosched  import PRIO_META, PRIO_BULK
+
+from tagnet      import tlv_errors
+
+ATTR_TTL = 5.0      # seconds attributes read from the tag are reused
+DIR_TTL  = 10.0     # seconds an image directory listing is reused
 
 base_value = 0
 
@@ -75,13 +85,34 @@ class FileHandler(OrderedDict):
                                     0)
         super(FileHandler, self).__init__(a_dict)
         self.inode = new_inode();
+        self.attrs_time = None
 
     def __len__(self):
         return 1
 
+    def attrs_fresh(self):
+        '''
+        True if the attributes were read from the tag within ATTR_TTL
+        '''
+        return (self.attrs_time is not None) and \
+            (time() - self.attrs_time < ATTR_TTL)
+
+    def attrs_invalidate(self):
+        self.attrs_time = None
+
+    def attrs_stale(self):
+        '''
+        True if the attributes are read from the tag and are due
+        '''
+        return False
+
     def getattr(self, path_list, update=False):
         return self
 
+    def release(self, path_list): # close
+        self.attrs_invalidate()
+        return 0
+
     def truncate(self, path_list, length):
         return 0
 
@@ -93,30 +124,55 @@ class ByteIOFileHandler(FileHandler):
     Byte IO File Handler class
 
     Performs Byte IO file specific operations.
+
+    Reads of an append-only file (dblk, panic) can be served from a
+    BlockCache or DblkMirror, only data not held locally is read over
+    the radio.
     '''
-    def __init__(self, radio, ntype, mode, nlinks):
+    def __init__(self, radio, ntype, mode, nlinks, cache=None):
         super(ByteIOFileHandler, self).__init__(ntype, mode, nlinks)
         self.radio = radio
+        self.cache = cache
 
     def read(self, path_list, size, offset):
         # zzz print('byte io read, size: {}, offset: {}'.format(size, offset))
-        buf, eof = file_get_bytes(self.radio,
-                                  path_list,
-                                  size,
-                                  offset)
+        if (self.cache is not None):
+            buf, eof = self.cache.read(path_list, size, offset,
+                        lambda amt, pos: self.radio.call(PRIO_BULK,
+                                                         file_get_bytes,
+                                                         path_list,
+                                                         amt,
+                                                         pos))
+        else:
+            buf, eof = self.radio.call(PRIO_BULK,
+                                       file_get_bytes,
+                                       path_list,
+                                       size,
+                                       offset)
         # zzz print(len(buf),eof)
         if (eof):
             raise FuseOSError(ENODATA)
+        if (len(buf) < size):
+            raise FuseOSError(EIO)      # tag stopped answering
         return buf
 
+    def attrs_stale(self):
+        return not self.attrs_fresh()
+
     def getattr(self, path_list, update=False):
-        if (update):
-            self = file_update_attrs(self.radio, path_list, self)
+        if (update) and not self.attrs_fresh():
+            err = self.radio.call(PRIO_META, file_update_attrs, path_list, self)
+            if (err is tlv_errors.SUCCESS):
+                self.attrs_time = time()
         return self
 
     def write(self, path_list, buf, offset):
         # zzz print('byte io write, size: {}, offset: {}'.format(len(buf), offset))
-        return file_put_bytes(self.radio,
+        self.attrs_invalidate()
+        if (self.cache is not None):
+            self.cache.invalidate(path_list)
+        return self.radio.call(PRIO_BULK,
+                        file_put_bytes,
                         path_list,
                         buf,
                         offset)
@@ -132,12 +188,16 @@ class ImageIOFileHandler(ByteIOFileHandler):
         self.radio = radio
         self.open = False
 
+    def attrs_stale(self):
+        return False
+
     def getattr(self, path_list, update=False):
         return self
 
     def read(self, path_list, size, offset):
         # zzz print('image io read, size: {}, offset: {}'.format(size, offset))
-        error, buf, offset = im_get_file(self.radio,
+        error, buf, offset = self.radio.call(PRIO_BULK,
+                               im_get_file,
                                path_list,
                                size,
                                offset)
@@ -149,7 +209,9 @@ class ImageIOFileHandler(ByteIOFileHandler):
     def write(self, path_list, buf, offset):
         # zzz
         print('image io write, size: {}, offset: {}'.format(len(buf), offset))
-        error, new_offset = im_put_file(self.radio,
+        self.attrs_invalidate()
+        error, new_offset = self.radio.call(PRIO_BULK,
+                           im_put_file,
                            path_list,
                            buf,
                            offset)
@@ -160,8 +222,10 @@ class ImageIOFileHandler(ByteIOFileHandler):
     def release(self, path_list): # close
         # zzz
         print('image io release')
-        if im_close_file(self.radio,
-                              path_list):
+        self.attrs_invalidate()
+        if self.radio.call(PRIO_META,
+                           im_close_file,
+                           path_list):
             return True
         raise FuseOSError(ENOENT)
 
@@ -170,8 +234,9 @@ class ImageIOFileHandler(ByteIOFileHandler):
         print('image io unlink')
         path_list[-1] = '<version:'+'.'.join(path_list[-1].split('.'))+'>'
         # zzz print(path_list)
-        return im_delete_file(self.radio,
-                              path_list)
+        return self.radio.call(PRIO_META,
+                               im_delete_file,
+                               path_list)
 
 class DblkIONoteHandler(FileHandler):
     '''
@@ -183,21 +248,26 @@ class DblkIONoteHandler(FileHandler):
         super(DblkIONoteHandler, self).__init__(ntype, mode, nlinks)
         self.radio = radio
 
+    def attrs_stale(self):
+        return not self.attrs_fresh()
+
     def getattr(self, path_list, update=False):
-        if (update):
-            attrs = file_update_attrs(self.radio, path_list, self)
-            print('dblk get attrs',attrs)
-            if (attrs):
-                self = attrs
+        if (update) and not self.attrs_fresh():
+            err = self.radio.call(PRIO_META, file_update_attrs, path_list, self)
+            print('dblk get attrs', err, self)
+            if (err is tlv_errors.SUCCESS):
+                self.attrs_time = time()
         return self
 
     def write(self, path_list, buf, offset):
         # zzz print('dblk io note, size: {}, offset: {}'.format(len(buf), offset))
+        self.attrs_invalidate()
         if (offset) or (len(buf) > 200):
             raise FuseOSError(ENODATA)
-        return dblk_put_note(self.radio,
-                             path_list,
-                             buf)
+        return self.radio.call(PRIO_META,
+                               dblk_put_note,
+                               path_list,
+                               buf)
 
 class DirHandler(OrderedDict):
     '''
@@ -243,10 +313,47 @@ class DirHandler(OrderedDict):
                     return handler   # match the terminal name
             return None
 
+    def walk(self, path=''):
+        """
+        Yield (path, handler) for every entry below this directory,
+        path is the fuse path of the entry when this directory is at
+        path.
+        """
+        for key, handler in self.iteritems():
+            if (key == ''):
+                continue
+            sub_path = path + '/' + key
+            yield sub_path, handler
+            if isinstance(handler, DirHandler):
+                for entry in handler.walk(sub_path):
+                    yield entry
+
     def getattr(self, path_list, update=False):
         print('getattr', path_list)
         return self['']
 
+    def refresh_attrs(self, path_list):
+        '''
+        Read the attributes that are due of the files in this directory
+        from the tag, all in one bundled exchange. Called by getattr on
+        the first miss in the directory, so the getattr of the other
+        entries is served from the handlers.
+        '''
+        stale = [(key, handler) for key, handler in self.iteritems()
+                 if (key != '') and isinstance(handler, FileHandler)
+                 and handler.attrs_stale()]
+        if (not stale):
+            return
+        radio = stale[0][1].radio
+        errors = radio.call(PRIO_META,
+                            files_update_attrs,
+                            [path_list + [key] for key, handler in stale],
+                            [handler for key, handler in stale])
+        now = time()
+        for (key, handler), err in zip(stale, errors):
+            if (err is tlv_errors.SUCCESS):
+                handler.attrs_time = now
+
     def readdir(self, path_list):
         # zzz print('base class readdir')
         # zzz print(self)
@@ -273,17 +380,59 @@ class ImageDirHandler(DirHandler):
     Software Images Directory Handler class
 
     Performs image directory specific operations.
+
+    The directory read from the tag is reused for DIR_TTL seconds, or
+    until a create, unlink or release in the directory. Only one
+    refresh goes to the tag at a time, readdir calls that find one in
+    progress return the entries already known. A failed refresh keeps
+    the entries known and is tried again on the next readdir.
     '''
     def __init__(self, radio, a_dict):
         # zzz print('init imagedirhandler')
         super(ImageDirHandler, self).__init__(a_dict)
         self.radio = radio
+        self.dir_time = None
+        self._refreshing = threading.Lock()
+
+    def dir_fresh(self):
+        return (self.dir_time is not None) and \
+            (time() - self.dir_time < DIR_TTL)
+
+    def dir_invalidate(self):
+        self.dir_time = None
 
     def readdir(self, path_list):
         # zzz print('image readdir', path_list)
-        dir_list = im_get_dir(self.radio, path_list)
+        if not self.dir_fresh():
+            self.refresh(path_list)
+        return super(ImageDirHandler, self).readdir(path_list)
+
+    def refresh(self, path_list):
+        '''
+        Read the image directory from the tag and add any new images
+
+        Returns False, without going to the tag, if another refresh
+        is in progress.
+        '''
+        if not self._refreshing.acquire(False):
+            return False
+        try:
+            self._refresh(path_list)
+        finally:
+            self._refreshing.release()
+        return True
+
+    def _refresh(self, path_list):
+        try:
+            dir_list = self.radio.call(PRIO_META, im_get_dir, path_list)
+        except EnvironmentError as e:
+            dir_list = None
+            print('image dir refresh failed: {}'.format(e))
         # zzz
         print('image dir list:', dir_list)
+        if (dir_list is None):
+            return              # keep the entries known, try again next time
+        self.dir_time = time()
         if (dir_list):
             for version, state in dir_list:
                 # zzz print(version, state)
@@ -300,7 +449,6 @@ class ImageDirHandler(DirHandler):
                                                     0o664,
                                                     1)
         # zzz print(self)
-        return super(ImageDirHandler, self).readdir(dir_list)
 
     def create(self, path_list, mode, file_name):
         print('image create',path_list,mode, file_name)
@@ -312,11 +460,13 @@ class ImageDirHandler(DirHandler):
                                                  S_IFREG,
                                                  0o664,
                                                  1)
+        self.dir_invalidate()
         return True
 
     def unlink(self, path_list):
-        base, name = os.path.split(path)
+        name = path_list[-1]
         print('image dir unlink', path_list, name)
+        self.dir_invalidate()
         try:
             del self[name]
             return True
@@ -326,6 +476,7 @@ class ImageDirHandler(DirHandler):
     def release(self, path_list): # close
         # zzz
         print('image dir release', path_list)
+        self.dir_invalidate()
 #        try:
 #            del self[path_list[-1]]
 #        except:
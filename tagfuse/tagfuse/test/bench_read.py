@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Benchmark of fixed and adaptively sized reads against a simulated tag
+
+SimTag stands in for the radio: it answers the GET requests of
+file_get_bytes from a buffer, the way the tag answers a dblk read
+(OFFSET and SIZE after the block in the payload, EODATA past the
+end), and keeps a simulated clock. Each frame costs its airtime at
+BIT_RATE and every request a fixed turnaround in the tag. Requests
+are handled in arrival order, a lost frame (either way) costs the
+receiver a MAX_WAIT timeout. Frames are lost at random (loss) or by
+bit errors (ber), which hit long frames more often. Like the real
+radio, which is half duplex with a single frame fifo, each send
+flushes any response not yet received.
+
+Reports simulated time, throughput and frames sent with and without
+frame loss, and for a noisy link with the TransferSizer either fixed
+at the largest size or adapting. Run from the tagfuse package
+directory:
+    python -m tagfuse.test.bench_read
+"""
+from __future__ import print_function
+
+import random
+import sys
+
+from tagfuse import radioutils, radiofile
+
+from tagnet import TagMessage, TagResponse
+from tagnet import TagTlvList, tlv_types, tlv_errors
+
+BIT_RATE    = 50000         # bits/sec over the air
+PREAMBLE    = 12            # bytes of preamble, sync word and crc
+TURNAROUND  = 0.010         # seconds for the tag to answer a request
+READ_SIZE   = 8192
+TOTAL       = 64 * 1024
+PATH = ['<node_id:1fa3b2c4d5e6>', 'tag', 'sd', '0', 'dblk', 'byte', '0']
+
+class SimTag(object):
+    '''
+    Simulated tag answering dblk reads over a simulated radio
+    '''
+    def __init__(self, data, loss=0.0, ber=0.0, seed=1):
+        self.data = data
+        self.loss = loss
+        self.ber = ber
+        self.random = random.Random(seed)
+        self.clock = 0.0
+        self.tag_free = 0.0
+        self.sent = 0
+        self._rsps = []             # (arrival time, frame)
+
+    def _airtime(self, frame):
+        return (len(frame) + PREAMBLE) * 8.0 / BIT_RATE
+
+    def _lost(self, frame):
+        bits = (len(frame) + PREAMBLE) * 8
+        p = 1 - (1 - self.loss) * (1 - self.ber) ** bits
+        return self.random.random() < p
+
+    def _answer(self, req):
+        pos = size = 0
+        for tlv in req.name:
+            if (tlv.tlv_type() is tlv_types.OFFSET):
+                pos = tlv.value()
+            elif (tlv.tlv_type() is tlv_types.SIZE):
+                size = tlv.value()
+        if (pos >= len(self.data)):
+            return TagResponse(req, payload=TagTlvList(
+                [(tlv_types.ERROR, tlv_errors.EODATA)]))
+        room = TagResponse(req, payload=TagTlvList(
+            [(tlv_types.OFFSET, pos), (tlv_types.SIZE, size)])).payload_avail() - 2
+        block = self.data[pos:pos + min(size, room)]
+        return TagResponse(req, payload=TagTlvList(
+            [(tlv_types.OFFSET, pos + len(block)),
+             (tlv_types.SIZE, size - len(block)),
+             (tlv_types.BLOCK, block)]))
+
+    def send(self, radio, frame, pwr):
+        self.sent += 1
+        self.clock += self._airtime(frame)
+        self._rsps = []             # radio_send_msg flushes the rx fifo
+        if (self._lost(frame)):
+            return
+        rsp = self._answer(TagMessage(bytearray(frame))).build()
+        start = max(self.clock, self.tag_free) + TURNAROUND
+        self.tag_free = start + self._airtime(rsp)
+        if (not self._lost(rsp)):
+            self._rsps.append((self.tag_free, rsp))
+
+    def receive(self, radio, max_recv, wait):
+        if (self._rsps) and (self._rsps[0][0] <= self.clock + wait):
+            arrival, rsp = self._rsps.pop(0)
+            self.clock = max(self.clock, arrival)
+            return rsp, 0, None
+        self.clock += wait
+        return None, 0, None
+
+#------------ end of class definition ---------------------
+
+def run(loss=0.0, ber=0.0, adapt=False, read_size=READ_SIZE, total=TOTAL):
+    """
+    read total bytes with reads of read_size, returns the SimTag
+    """
+    data = bytearray(random.Random(0).getrandbits(8) for _ in range(total))
+    tag = SimTag(data, loss, ber)
+    sizer = radioutils.TransferSizer(adapt=adapt)
+    radioutils._sizers[radioutils.tag_node_id(PATH)] = sizer
+    radioutils.radio_send_msg = tag.send
+    radioutils.radio_receive_msg = tag.receive
+    got = bytearray()
+    while (len(got) < total):
+        buf, eof = radiofile.file_get_bytes(None, PATH, read_size, len(got))
+        got += buf                      # short after giving up, read on
+        if (eof):
+            break
+    if (got != data):
+        raise AssertionError('loss {}, ber {}: data mismatch'.format(loss, ber))
+    return tag
+
+def _quiet(fn, *args, **kwargs):
+    out = sys.stdout
+    sys.stdout = open('/dev/null', 'w')     # silence read traces
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        sys.stdout.close()
+        sys.stdout = out
+
+def main():
+    rows = []
+    for loss in (0.0, 0.05):
+        rows.append(('loss {:.2f}'.format(loss), 'fixed',
+                     _quiet(run, loss=loss, adapt=False)))
+    for ber in (2e-4, 1e-3):
+        for adapt in (False, True):
+            rows.append(('ber {:.0e}'.format(ber),
+                         'adapt' if (adapt) else 'fixed',
+                         _quiet(run, ber=ber, adapt=adapt)))
+    print('{:<10} {:>6} {:>10} {:>8} {:>8}'.format(
+        'link', 'size', 'sim secs', 'KB/sec', 'frames'))
+    for link, size, tag in rows:
+        print('{:<10} {:>6} {:>10.2f} {:>8.2f} {:>8}'.format(
+            link, size, tag.clock, TOTAL / 1024.0 / tag.clock, tag.sent))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,7 +11,8 @@ from twisted.python       import log
 
 from construct            import *
 
-from tagnet               import TagPayload, TagResponse, TagMessage
+from tagnet               import TagResponse, TagMessage, TagRouter
+from tagnet               import TagBundle, unbundle
 
 log.startLogging(sys.stdout)
 
@@ -25,12 +26,25 @@ send_count = 0
 recv_count = 0
 robj = None
 
+def generic_response(req, params):
+    return TagResponse(req)
+
+# dispatch table of request names, answer anything else generically
+router = TagRouter(default=generic_response)
+
+def bundle_response(req, params):
+    # answer each bundled request, in order, as far as they fit
+    return TagBundle([router.route(msg) for msg in unbundle(req)],
+                     response=True)
+
+router.register('/tag/bundle', bundle_response)
+
 #@defer.inlineCallbacks
 def on_receive(rxbuf, rssi):
     global send_count, recv_count
     recv_count += 1
     log.msg('got {}:{}, {}'.format(len(rxbuf), rssi, hexlify(bytearray(rxbuf))))
-    rsp = TagResponse(TagMessage(bytearray(rxbuf)))
+    rsp = router.route(TagMessage(bytearray(rxbuf)))
 #    e = yield robj.callRemote('send', rsp.build(), pwr)
     e=0
     log.msg('send packet s:{} r:{} e:{}, {}'.format(send_count, recv_count, e, hexlify(rsp.build())))
@@ -29,9 +29,11 @@ A protocol for named data objects in an ad hoc network of constraint-based nodes
     author           = 'Dan Maltbie',
     author_email     = 'dmaltbie@daloma.org',
     install_requires = ['twisted>=10.1', 'six', 'temporenc', 'construct', 'uuid', 'datetime', 'future', 'enum34'],
+    extras_require   = {'batch': ['numpy']},
     provides         = ['tagnet'],
     packages         = ['tagnet',
                         'tagnet.test'],
+    package_data     = {'tagnet.test': ['bench_baseline.json']},
     keywords         = ['tagnet', 'twisted', 'dbus'],
     classifiers      = ['License :: OSI Approved :: MIT License',
                         'Development Status :: 4 - Beta',
@@ -21,3 +21,6 @@ from .tagnames import *
 from .tagmessages import *
 from .tagdef import *
 from .tagtlv import *
+from .tagrouter import *
+from .tagstream import *
+from .tagbatch import *
@@ -0,0 +1,180 @@
+from __future__ import print_function   # python3 print function
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from tagdef import *
+from tagdef import _message_type_names
+from tagtlv import *
+
+__all__ = ['frame_offsets', 'frame_dtype', 'decode_frames', 'BATCH_TLV_TYPES']
+
+# tlvs extracted by default, one column each
+BATCH_TLV_TYPES = (tlv_types.OFFSET, tlv_types.SIZE,
+                   tlv_types.NODE_ID, tlv_types.ERROR)
+
+# tlv types with a fixed size integer value (NODE_ID read in network order)
+_INT_TLV_TYPES = (tlv_types.INTEGER, tlv_types.NODE_ID, tlv_types.OFFSET,
+                  tlv_types.SIZE, tlv_types.RECNUM, tlv_types.RECCNT,
+                  tlv_types.DELAY, tlv_types.ERROR)
+
+_HEADER_FIELDS = [('start',        'i8'),    # offset of frame in buffer
+                  ('frame_length', 'u1'),
+                  ('response',     '?'),
+                  ('version',      'u1'),
+                  ('tlv_payload',  'u1'),    # 0 = RAW, 1 = TLV_LIST
+                  ('message_type', 'u1'),    # index of tagdef message types
+                  ('param',        'u1'),    # hop count or error code
+                  ('name_length',  'u1')]
+
+def _require_numpy():
+    if (np is None):
+        raise ImportError('tagbatch requires numpy')
+
+def frame_offsets(buf, start=0):
+    """
+    return the offsets of the frames packed back to back in buf
+
+    Each frame is 1 + frame_length bytes. A partial frame at the end
+    of buf is left out.
+    """
+    _require_numpy()
+    ba = buf if isinstance(buf, bytearray) else bytearray(buf)
+    offsets = []
+    n = len(ba)
+    while (start < n) and (start + ba[start] + 1 <= n):
+        offsets.append(start)
+        start += ba[start] + 1
+    return np.array(offsets, dtype=np.int64)
+
+def frame_dtype(tlvs=BATCH_TLV_TYPES):
+    """
+    structured dtype of decode_frames() results
+
+    The header fields are followed by a value column and a has_ flag
+    column for each tlv type, named after the type (e.g. offset and
+    has_offset).
+    """
+    _require_numpy()
+    fields = list(_HEADER_FIELDS)
+    for t in tlvs:
+        if (t not in _INT_TLV_TYPES):
+            raise ValueError('not a fixed size tlv type: {}'.format(t))
+        fields.extend([(t.name.lower(), 'u8'), ('has_' + t.name.lower(), '?')])
+    return np.dtype(fields)
+
+def _be_int(a, start, length):
+    """
+    read big endian integers of the given lengths (at most 8 bytes)
+    """
+    val = np.zeros(len(start), dtype=np.uint64)
+    for k in range(int(length.max()) if len(length) else 0):
+        m = k < length
+        val[m] = (val[m] << np.uint64(8)) | a[start[m] + k].astype(np.uint64)
+    return val
+
+def _walk_tlvs(a, out, pos, end, wanted):
+    """
+    fill in the wanted tlv columns from the tlvs between pos and end
+
+    Every frame advances one tlv per pass. A column already set is
+    left alone.
+    """
+    active = (pos + 2) <= end
+    while active.any():
+        idx = np.nonzero(active)[0]
+        p = pos[idx]
+        t = a[p]
+        l = a[p + 1].astype(np.int64)
+        ok = (p + 2 + l) <= end[idx]
+        for value, name in wanted:
+            hit = ok & (l <= 8) & (t == value) & ~out['has_' + name][idx]
+            if hit.any():
+                rows = idx[hit]
+                out[name][rows] = _be_int(a, p[hit] + 2, l[hit])
+                out['has_' + name][rows] = True
+        pos[idx] = p + 2 + l
+        active[idx] = ok & ((pos[idx] + 2) <= end[idx])
+
+def decode_frames(buf, offsets=None, tlvs=BATCH_TLV_TYPES):
+    """
+    decode the headers and selected tlvs of many frames at once
+
+    buf holds the frames, offsets the start of each (found with
+    frame_offsets() if not given). Returns a structured array, one row
+    per frame, see frame_dtype().
+
+    The first occurrence of each tlv type is taken from the payload,
+    when it is a tlv list, or else from the name. Requests carry OFFSET
+    and SIZE in the name, responses in the payload.
+
+    All frames are processed together, one pass per tlv position, so
+    the cost grows with the number of tlvs in the longest frame rather
+    than with the number of frames.
+    """
+    _require_numpy()
+    a = np.frombuffer(buf, dtype=np.uint8)
+    if (offsets is None):
+        offsets = frame_offsets(buf)
+    starts = np.asarray(offsets, dtype=np.int64)
+    out = np.zeros(len(starts), dtype=frame_dtype(tlvs))
+    hs = TAGNET_HEADER_SIZE
+    if (len(starts) == 0):
+        return out
+    if (starts.max() + hs > len(a)):
+        raise ValueError('frame header past end of buffer')
+    h = a[starts[:, None] + np.arange(hs)]
+    out['start']        = starts
+    out['frame_length'] = h[:, 0]
+    out['response']     = h[:, 1] >> 7
+    out['version']      = (h[:, 1] >> 4) & 0x07
+    out['tlv_payload']  = h[:, 1] & 0x01
+    out['message_type'] = h[:, 2] >> 5
+    out['param']        = h[:, 2] & 0x1f
+    out['name_length']  = h[:, 3]
+
+    frame_end = np.minimum(starts + 1 + h[:, 0], len(a))
+    name_end = np.minimum(starts + hs + h[:, 3], frame_end)
+    wanted = [(t.value, t.name.lower()) for t in tlvs]
+    # payload first, so a response reports its own values over the
+    # ones in the request name it echoes
+    _walk_tlvs(a, out, name_end.copy(),
+               np.where(out['tlv_payload'] == 1, frame_end, name_end), wanted)
+    _walk_tlvs(a, out, starts + hs, name_end, wanted)
+    return out
+
+def tagbatch_test():
+    if (np is None):
+        print('tagbatch_test skipped, numpy not available')
+        return None
+    from tagmessages import TagGet, TagHead, TagResponse
+    from tagnames import TagName
+    nid = 0x1fa3b2c4d5e6
+    req = TagGet(TagName('/tag/sd') + TagTlv(tlv_types.NODE_ID, '1fa3b2c4d5e6')
+                 + TagTlv(tlv_types.OFFSET, 129000) + TagTlv(tlv_types.SIZE, 200))
+    rsp = TagResponse(req, payload=TagTlvList([(tlv_types.ERROR, tlv_errors.EODATA),
+                                               (tlv_types.OFFSET, 5)]))
+    raw = TagHead(TagName('/tag/x'), bytearray(b'\x09\x01\x07'))
+    buf = req.build() + rsp.build() + raw.build()
+    res = decode_frames(buf)
+    if (list(res['start']) != [0, req.pkt_len(), req.pkt_len() + rsp.pkt_len()]):
+        print('frame offsets error: ', res['start'])
+    if (_message_type_names[res['message_type'][0]] != 'GET') or \
+       (list(res['response']) != [False, True, False]) or \
+       (res['param'][0] != DEFAULT_HOPCOUNT) or \
+       (res['name_length'][0] != req.header.name_length):
+        print('header decode error: ', res[0])
+    if (res['offset'][0] != 129000) or (res['size'][0] != 200) or \
+       (res['node_id'][0] != nid) or (res['has_error'][0]):
+        print('request tlv error: ', res[0])
+    if (res['error'][1] != tlv_errors.EODATA.value) or (res['offset'][1] != 5) or \
+       (res['size'][1] != 200):
+        print('response tlv error: ', res[1])
+    if (res['has_offset'][2]) or (res['has_size'][2]):   # raw payload not walked
+        print('raw payload error: ', res[2])
+    return res
+
+if __name__ == '__main__':
+    tagbatch_test()
@@ -10,7 +10,7 @@ import copy
 
 from tagdef import *
 
-from tagnames import TagName
+from tagnames import TagName, FrozenTagName, TagNamePrefix
 
 from tagtlv import tlv_types
 #
@@ -20,10 +20,30 @@ from tagtlv import tlv_types
 from tagtlv import *
 
 __all__ = ['TagMessage', 'TagPoll', 'TagBeacon',
-           'TagGet', 'TagPut', 'TagHead', 'TagDelete', 'TagResponse']
+           'TagGet', 'TagPut', 'TagHead', 'TagDelete', 'TagResponse',
+           'TagBundle', 'is_bundle', 'unbundle']
 
 MAX_TAGNET_PKT_SIZE = 254
 
+# name of the request that carries a bundle of requests
+BUNDLE_NAME = '/tag/bundle'
+_bundle_prefix = TagNamePrefix(TagName(BUNDLE_NAME))
+
+# tlv list classes accepted for message names and tlv payloads
+TAG_NAME_TYPES = (TagName, TagTlvArray, FrozenTagName)
+TLV_LIST_TYPES = (TagTlvList, TagTlvArray)
+
+# marks a name or payload that has not been decoded from the wire yet
+_UNDECODED = object()
+
+def _share(v):
+    """
+    copy-on-write copy of a message name or payload
+    """
+    if (v is None) or (v is _UNDECODED) or isinstance(v, bytearray):
+        return v
+    return v.copy()
+
 
 #------------ main message class definitions ---------------------
 
@@ -56,18 +76,21 @@ class TagMessage(object):
 
         Note this class is intended to be subclassed as a set of classes for the
         message type and payload specifics of the various protocol message types.
+
+        When initialized from a bytearray only the header is decoded. The
+        name and payload are decoded from the wire on first access.
         """
         super(TagMessage,self).__init__()
-        self.header = tagnet_message_header_s.parse('\x00'
-                                                * tagnet_message_header_s.sizeof())
-        self.name = None
-        self.payload = None
+        self.header = TagHeader()
+        self._raw = None
+        self._name = None
+        self._payload = None
         if (len(args) == 2):                   # input is (name [, payload])
-            if isinstance(args[0], TagName):
+            if isinstance(args[0], TAG_NAME_TYPES):
                 self.name = args[0].copy()
             else:
                 raise TypeError('too few/many arguments')
-            if (args[1]) and isinstance(args[1], TagTlvList):
+            if (args[1]) and isinstance(args[1], TLV_LIST_TYPES):
                 self.payload = args[1].copy()
             elif (args[1]) and isinstance(args[1], bytearray):
                 self.payload = args[1]
@@ -76,26 +99,27 @@ class TagMessage(object):
         elif (len(args) == 1):
             if isinstance(args[0], TagMessage):               # input is message
                 self.name = args[0].name.copy()
-                if (args[0].payload) and isinstance(args[0].payload, TagTlvList):
+                if (args[0].payload) and isinstance(args[0].payload, TLV_LIST_TYPES):
                     self.payload = args[0].payload.copy()
                 elif (args[0].payload) and isinstance(args[0].payload, bytearray):
                     self.payload = args[0].payload
                 else:
                     raise TypeError('bad payload type')
-            elif isinstance(args[0], TagName):                # input is name
+            elif isinstance(args[0], TAG_NAME_TYPES):         # input is name
                 self.name = args[0].copy()
             elif isinstance(args[0], bytearray):              # input is bytearray
                 self.parse(args[0])
+                return                    # header already set from the wire
             else:
                 raise TypeError('bad input type: {}, value:'.format(type(args[0]), hexlify(args[0])))
         else:
             raise ValueError('too few/many arguments')
-        self.header.frame_length = tagnet_message_header_s.sizeof() - 1
+        self.header.frame_length = TAGNET_HEADER_SIZE - 1
         if (self.name):
             self.header.name_length = self.name.pkt_len()
             self.header.frame_length += self.header.name_length
             self.header.options.version = TAGNET_VERSION
-            if (self.payload) and (isinstance(self.payload, TagTlvList)):
+            if (self.payload) and (isinstance(self.payload, TLV_LIST_TYPES)):
                 self.header.options.tlv_payload = 'TLV_LIST'
                 self.header.frame_length += self.payload.pkt_len()
             elif (self.payload) and (isinstance(self.payload, bytearray)):
@@ -106,12 +130,89 @@ class TagMessage(object):
         else:
             print('error in constructing tag message:',args)
 
+    @property
+    def name(self):
+        if (self._name is _UNDECODED):
+            hs = TAGNET_HEADER_SIZE
+            self._name = TagName(self._raw[hs:hs+self.header.name_length])
+        return self._name
+
+    @name.setter
+    def name(self, v):
+        self._name = v
+
+    @property
+    def payload(self):
+        if (self._payload is _UNDECODED):
+            start = TAGNET_HEADER_SIZE + self.header.name_length
+            if (self.header.options.tlv_payload == 'TLV_LIST'):
+                self._payload = TagTlvList(self._raw[start:])
+            else:
+                self._payload = bytearray(self._raw[start:])
+        return self._payload
+
+    @payload.setter
+    def payload(self, v):
+        self._payload = v
+
+    def payload_views(self):
+        """
+        iterate over the payload tlvs as TagTlvViews
+
+        Walks the received frame directly when the payload has not been
+        decoded yet, so checking the first payload tlv costs no decoding.
+        """
+        if (self._payload is _UNDECODED):
+            if (self.header.options.tlv_payload == 'TLV_LIST'):
+                start = TAGNET_HEADER_SIZE + self.header.name_length
+                return tlv_views(self._raw, start)
+            return iter([])
+        if isinstance(self._payload, TagTlvArray):
+            return self._payload.views()
+        if isinstance(self._payload, TagTlvList):
+            return tlv_views(self._payload.build())
+        return iter([])
+
+    def name_key(self):
+        """
+        return the message name as a FrozenTagName, for use as a dict key
+
+        Made straight from the received frame when the name has not been
+        decoded.
+        """
+        if isinstance(self._name, FrozenTagName):
+            return self._name
+        return FrozenTagName(bytearray(self._name_bytes()))
+
+    def _name_bytes(self):
+        if (self._name is _UNDECODED):
+            hs = TAGNET_HEADER_SIZE
+            return memoryview(self._raw)[hs:hs+self.header.name_length]
+        return self.name.build()
+
+    def _payload_bytes(self):
+        if (self._payload is _UNDECODED):
+            start = TAGNET_HEADER_SIZE + self.header.name_length
+            return memoryview(self._raw)[start:]
+        if (self.payload):
+            if isinstance(self.payload, TLV_LIST_TYPES): return self.payload.build()
+            elif isinstance(self.payload, bytearray):    return self.payload
+        return bytearray()
+
     def copy(self):
         """
         make a copy of this message in a new message object
+
+        The copy is copy-on-write. Its name and payload share their
+        encoded bytes with this message (or the received frame, when not
+        yet decoded) until one of them is modified. A raw bytearray
+        payload is shared as is.
         """
-        msg = TagMessage(self)
-        msg.header = copy.copy(self.header)
+        msg = TagMessage.__new__(TagMessage)
+        msg.header = self.header.copy()
+        msg._raw = self._raw
+        msg._name = _share(self._name)
+        msg._payload = _share(self._payload)
         return msg
 
     def pkt_len(self):
@@ -120,11 +221,17 @@ class TagMessage(object):
 
         Note that value may change if message is further modified.
         """
+        if (self._name is _UNDECODED):
+            l_nm = self.header.name_length
+        else:
+            l_nm = self.name.pkt_len()
         l_pl = 0
-        if (self.payload):
-            if isinstance(self.payload, TagTlvList):  l_pl = self.payload.pkt_len()
-            elif isinstance(self.payload, bytearray): l_pl = len(self.payload)
-        return sum([tagnet_message_header_s.sizeof(),self.name.pkt_len(),l_pl])
+        if (self._payload is _UNDECODED):
+            l_pl = len(self._raw) - TAGNET_HEADER_SIZE - self.header.name_length
+        elif (self.payload):
+            if isinstance(self.payload, TLV_LIST_TYPES): l_pl = self.payload.pkt_len()
+            elif isinstance(self.payload, bytearray):    l_pl = len(self.payload)
+        return sum([TAGNET_HEADER_SIZE,l_nm,l_pl])
 
     def payload_avail(self):
         used_bytes = self.pkt_len()
@@ -148,38 +255,43 @@ class TagMessage(object):
     def build(self):
         """
         construct the wire format byte string of the message
+
+        A name or payload that was never decoded is copied straight from
+        the received frame. A payload still in the frame is decoded first
+        when the name changed length, the header then no longer says
+        where it starts.
         """
-        if (self.payload):
-            if isinstance(self.payload, TagTlvList):  l_pl = self.payload.pkt_len()
-            elif isinstance(self.payload, bytearray): l_pl = len(self.payload)
-        else:                                         l_pl = 0
-        self.header.frame_length = (tagnet_message_header_s.sizeof() - 1) \
-                                   + self.name.pkt_len() \
-                                   + l_pl
-        self.header.name_length = self.name.pkt_len()
-        self.header.options.tlv_payload = \
-                        'TLV_LIST' if (self.payload and isinstance(self.payload, TagTlvList)) \
+        nb = self._name_bytes()
+        if (self._payload is _UNDECODED) and \
+           (len(nb) != self.header.name_length):
+            self.payload                # decode at the old name length
+        pb = self._payload_bytes()
+        self.header.frame_length = (TAGNET_HEADER_SIZE - 1) + len(nb) + len(pb)
+        self.header.name_length = len(nb)
+        if (self._payload is not _UNDECODED):
+            self.header.options.tlv_payload = \
+                        'TLV_LIST' if (self.payload and isinstance(self.payload, TLV_LIST_TYPES)) \
                         else 'RAW'
-        l = tagnet_message_header_s.build(self.header) + self.name.build()
-        if (self.payload):
-            if isinstance(self.payload, TagTlvList):  l += self.payload.build()
-            elif isinstance(self.payload, bytearray): l += self.payload
-        return bytearray(l)
+        l = self.header.build()
+        l += nb
+        l += pb
+        return l
 
     def parse(self, v):
         """
         deconstruct a wire formated byte string into the message class
+
+        Only the header is decoded here, the name and payload are decoded
+        on first access. The byte string is referenced, not copied.
         """
-        hdr_size = tagnet_message_header_s.sizeof()
-        self.header = tagnet_message_header_s.parse(v[0:hdr_size])
-        self.name = TagName(v[hdr_size:self.header.name_length+hdr_size])
+        hdr_size = TAGNET_HEADER_SIZE
+        self.header = TagHeader.parse(v)
+        self._raw = v
+        self._name = _UNDECODED
         if len(v) > (hdr_size + self.header.name_length):
-            if (self.header.options.tlv_payload == 'TLV_LIST'):
-                self.payload = TagTlvList(v[self.header.name_length+hdr_size:])
-            else:
-                self.payload = bytearray(v[self.header.name_length+hdr_size:])
+            self._payload = _UNDECODED
         else:
-            self.payload = None
+            self._payload = None
 
 #------------ end of class definition ---------------------
 
@@ -316,6 +428,73 @@ class TagResponse(TagMessage):
 
 #------------ end of class definition ---------------------
 
+class TagBundle(TagMessage):
+    """
+    Instantiate a TagNet Bundle message
+
+    Carries several complete requests (or responses) in one frame. Each
+    message is held fully built as a BLOCK tlv of the payload, so a
+    bundle costs 2 bytes per message plus the bundle header and name.
+
+    Requests are bundled in a GET on /tag/bundle. The response is a
+    bundle holding the responses in the same order. A responder that
+    runs out of room leaves the remaining responses out, and the sender
+    is expected to retry those on their own.
+    """
+    def __init__(self, msgs=None, response=False, hop_count=None):
+        """
+        add msgs to a new bundle, stopping at the first one that does
+        not fit
+        """
+        super(TagBundle,self).__init__(_bundle_prefix.extend())
+        self.payload = TagTlvArray()
+        self.header.options.message_type = 'GET'
+        if (response):
+            self.header.options.response = True
+            self.header.options.param.hop_count = 0
+        elif (hop_count):
+            self.hop_count(hop_count)
+        else:
+            self.hop_count(DEFAULT_HOPCOUNT)
+        for msg in (msgs or []):
+            if not self.add(msg):
+                break
+
+    def add(self, msg):
+        """
+        append msg to the bundle
+
+        Returns False, leaving the bundle unchanged, if msg does not fit.
+        """
+        ob = msg.build()
+        if (len(ob) + 2) > self.payload_avail():
+            return False
+        self.payload.append(TagTlv(tlv_types.BLOCK, ob))
+        return True
+
+    def __len__(self):
+        return len(self.payload)
+
+#------------ end of class definition ---------------------
+
+def is_bundle(msg):
+    """
+    True if msg (request or response) is a bundle of messages
+    """
+    return msg.name_key() == FrozenTagName(BUNDLE_NAME)
+
+def unbundle(msg):
+    """
+    iterate over the messages carried in a bundle, in order
+
+    Each message is parsed from its BLOCK tlv when reached.
+    """
+    for view in msg.payload_views():
+        if (view.tlv_type() is tlv_types.BLOCK):
+            yield TagMessage(bytearray(view.raw()[2:]))
+
+#------------ end of function definitions ---------------------
+
 class TagId(object):
     """
     """
@@ -347,7 +526,7 @@ def tagmessages_test():
     print('tx',hexlify(txpoll))
     print('cx',hexlify(cxpoll))
 
-    hdr_size = tagnet_message_header_s.sizeof()
+    hdr_size = TAGNET_HEADER_SIZE
     print('txheader == xxheader',
           hexlify(txpoll[0:hdr_size]) == hexlify(cxpoll[0:hdr_size]),
           hexlify(txpoll[0:hdr_size]), hexlify(cxpoll[0:hdr_size]))
@@ -365,6 +544,38 @@ def tagmessages_test():
 
     return tmpoll, txpoll, tmrsp, cmpoll, cxpoll, tmput, tbput
 
+def tagbundle_test():
+    reqs = [TagHead(TagName('/tag/sd/0/dblk/byte/.recnum')),
+            TagHead(TagName('/tag/sd/0/dblk/byte/.last_rec')),
+            TagGet(TagName('/tag/sd/0/dblk/byte/0')
+                   + TagTlv(tlv_types.OFFSET, 512) + TagTlv(tlv_types.SIZE, 32))]
+    tb = TagBundle(reqs)
+    if (len(tb) != len(reqs)): print('bundle add error: ', len(tb))
+    rb = TagMessage(tb.build())
+    if (not is_bundle(rb)) or (is_bundle(reqs[0])): print('is_bundle error')
+    for req, msg in zip(reqs, unbundle(rb)):
+        if (msg.build() != req.build()): print('unbundle error: ', msg.name)
+    rsps = TagBundle([TagResponse(m, payload=TagTlvList([(tlv_types.SIZE, 10)]))
+                      for m in unbundle(rb)], response=True)
+    rsps = TagMessage(rsps.build())
+    if (not rsps.header.options.response) or \
+       ([m.payload[0].value() for m in unbundle(rsps)] != [10, 10, 10]):
+        print('bundle response error: ', rsps.payload)
+    rg = TagMessage(reqs[2].build())        # rename before payload decode
+    rg.name = TagName('/tag/x')
+    rg = TagMessage(rg.build())
+    if (rg.name != TagName('/tag/x')) or (rg.payload) or \
+       (reqs[2].payload):
+        print('rename error: ', rg.name, rg.payload)
+    rp = TagMessage(rsps.build())
+    rp.name = TagName('/tag/x')
+    rp.build()
+    if (rp.payload.build() != rsps.payload.build()):
+        print('rename payload error: ', rp.payload)
+    big = TagBundle([TagPut(TagName('/tag/x'), bytearray(100))] * 3)
+    if (len(big) != 2): print('bundle overflow error: ', len(big))
+    return tb, rsps
 
 if __name__ == '__main__':
+    tagbundle_test()
     tagmessages_test()
@@ -4,8 +4,6 @@ from os.path import normpath, commonprefix
 from tagdef import *
 from tagtlv import *
 
-import copy
-
 class TagName(TagTlvList):
     """
     constructor for tag names, which consist of a list of tag tlv's that represent the hierachical order of
@@ -22,11 +20,143 @@ class TagName(TagTlvList):
         """
         super(TagName,self).__init__(*args, **kwargs)
 
+#------------ end of class definition ---------------------
+
+class TagNamePrefix(object):
+    """
+    frozen, pre-encoded name prefix
+
+    Holds the network format of the leading tlvs of a name. New names
+    are made by extending a copy of the encoded bytes with suffix tlvs,
+    the prefix itself is never re-encoded or modified. Callers keep the
+    prefixes they reuse, e.g. tagfuse keeps one per path in its LRU
+    path cache.
+    """
+    __slots__ = ('_tlvs',)
+
+    def __init__(self, tlvs):
+        self._tlvs = TagTlvArray(tlvs)
+
+    def extend(self, *tlvs):
+        """
+        return a new name (TagTlvArray) of the prefix followed by tlvs
+        """
+        name = self._tlvs.copy()
+        name.extend(tlvs)
+        return name
+
+    def build(self):
+        return self._tlvs.build()
+
+    def pkt_len(self):
+        return self._tlvs.pkt_len()
+
+    def __len__(self):
+        return len(self._tlvs)
+
+    def __repr__(self):
+        return repr(self._tlvs)
+
+#------------ end of class definition ---------------------
+
+class FrozenTagName(object):
+    """
+    immutable tag name, usable as a dictionary key
+
+    The name is held as its encoded (network format) bytes. The hash is
+    computed once from those bytes, equality and prefix checks compare
+    the raw bytes. Since tlv encoding is self-delimiting, a byte prefix
+    match is always a match on whole tlvs.
+    """
+    __slots__ = ('_buf', '_hash')
+
+    def __init__(self, name=None):
+        """
+        New object can be initialized from:
+            - string     = url formatted string, same as TagName
+            - bytearray  = network formatted tlvs
+            - TagName, TagTlvList, TagTlvArray, TagNamePrefix or FrozenTagName
+            - None       = empty name
+        """
+        if (name is None):
+            buf = b''
+        elif isinstance(name, FrozenTagName):
+            buf = name._buf
+        elif isinstance(name, bytearray):
+            for view in tlv_views(name):    # validate the encoding
+                pass
+            buf = bytes(name)
+        elif isinstance(name, types.StringType):
+            buf = bytes(TagName(name).build())
+        elif isinstance(name, (TagTlvList, TagTlvArray, TagNamePrefix)):
+            buf = bytes(bytearray(name.build()))
+        else:
+            raise TlvListBadException(name)
+        self._buf = buf
+        self._hash = hash(buf)
+
+    def build(self):
+        """
+        return the network format of the name
+        """
+        return bytearray(self._buf)
+
     def copy(self):
         """
-        make an exact copy of this name in a new list object
+        immutable, so a copy is the object itself
+        """
+        return self
+
+    def pkt_len(self):
+        return len(self._buf)
+
+    def startswith(self, d):
+        """
+        True if this name begins with the name d (compared as raw bytes)
+        """
+        if not isinstance(d, FrozenTagName):
+            d = FrozenTagName(d)
+        return self._buf.startswith(d._buf)
+
+    def thaw(self):
         """
-        return copy.deepcopy(TagName(self))
+        return a mutable TagName with the same tlvs
+        """
+        return TagName(self.build())
+
+    def views(self):
+        return tlv_views(bytearray(self._buf))
+
+    def __len__(self):
+        return sum(1 for view in self.views())
+
+    def __iter__(self):
+        for view in self.views():
+            yield TagTlv(view)
+
+    def __getitem__(self, i):
+        return list(self)[i]
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenTagName):
+            return (self._hash == other._hash) and (self._buf == other._buf)
+        if isinstance(other, (TagTlvList, TagTlvArray)):
+            return self._buf == bytes(bytearray(other.build()))
+        return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __setattr__(self, attr, v):
+        if hasattr(self, '_hash'):
+            raise AttributeError('FrozenTagName is immutable')
+        super(FrozenTagName, self).__setattr__(attr, v)
+
+    def __repr__(self):
+        return 'FrozenTagName({})'.format(list(self))
 
 #------------ end of class definition ---------------------
 
@@ -40,6 +170,18 @@ def tagnames_test():
     if (v1 == v3): print('compare error: ',v1,v3)
     if (not v3.startswith(v1)): print('startswith error: ',v3,v1)
     if (v1.startswith(v3)): print('startswith error: ',v1,v3)
+    p1 = TagNamePrefix(TagName('tgn://foo/bar'))
+    v4 = p1.extend(TagTlv(tlv_types.STRING, 'baz'))
+    if (v4 != v3): print('prefix extend error: ',v4,v3)
+    if (len(p1) != 3): print('prefix modified error: ',p1)
+    f1 = FrozenTagName(v1)
+    f3 = FrozenTagName(v3.build())
+    if ({f1: 1}.get(FrozenTagName('tgn://foo/bar')) != 1): print('hash error: ',f1)
+    if (f1 != v1) or (f1 == f3): print('frozen compare error: ',f1,f3)
+    if (not f3.startswith(v1)) or (f1.startswith(f3)): print('frozen startswith error: ',f3,f1)
+    a1 = TagTlvArray(v1)
+    if (a1 != f1) or (f1 != a1) or (not a1 == f1): print('frozen array compare error: ',a1,f1)
+    if (a1 == f3) or (f3 == a1): print('frozen array compare error: ',a1,f3)
     return (v1,v2,v3)
 
 if __name__ == '__main__':
@@ -0,0 +1,202 @@
+from __future__ import print_function   # python3 print function
+import os, types
+from os.path import normpath
+
+from tagtlv import *
+from tagnames import TagName, FrozenTagName
+
+__all__ = ['TagRouter']
+
+#------------ internal trie node ---------------------
+
+class _RouteNode(object):
+    """
+    one level of the name trie
+
+    Children are keyed by the encoded bytes of a literal tlv, by tlv type
+    for typed wildcard slots, or held in a single any-type wildcard slot.
+    """
+    __slots__ = ('literal', 'typed', 'wild', 'exact', 'prefix')
+
+    def __init__(self):
+        self.literal = {}       # encoded tlv bytes -> node
+        self.typed   = {}       # tlv_types         -> node
+        self.wild    = None     # any tlv           -> node
+        self.exact   = None     # (handler, capture names), whole name matched
+        self.prefix  = None     # (handler, capture names), name may continue
+
+    def child(self, kind, key):
+        if (kind == 'literal'):
+            return self.literal.setdefault(key, _RouteNode())
+        if (kind == 'typed'):
+            return self.typed.setdefault(key, _RouteNode())
+        if (self.wild is None):
+            self.wild = _RouteNode()
+        return self.wild
+
+#------------ end of class definition ---------------------
+
+class TagRouter(object):
+    """
+    dispatches TagNet requests to handlers by name
+
+    Name patterns are compiled into a trie keyed by tlv, so resolving a
+    name takes time proportional to the depth of the name rather than the
+    number of registered handlers.
+
+    Patterns are url formatted strings. Each component is one of:
+        <name>            wildcard slot. If name is a tlv type (e.g.
+                          <node_id>, <offset>) only that type matches,
+                          otherwise any tlv matches
+        <node_id:...>     literal, same as TagTlv
+        <version:...>     literal, same as TagTlv
+        digits            literal integer tlv (as encoded by path2tlvs)
+        anything else     literal string tlv
+    A pattern can also be a list of TagTlv (literal), tlv_types (typed
+    wildcard) and None (any tlv).
+
+    Example:
+        router.register('/<node_id>/tag/sd/0/dblk/byte/<n>', dblk_read,
+                        prefix=True)
+    """
+    def __init__(self, default=None):
+        """
+        default is called for requests that match no registered pattern
+        """
+        self._root = _RouteNode()
+        self.default = default
+
+    def _compile(self, pattern):
+        """
+        translate a pattern into a list of (kind, key, capture name)
+        """
+        steps = []
+        if isinstance(pattern, types.StringType):
+            for c in normpath(pattern).split(os.sep):
+                if (c == ''):
+                    continue
+                if (c[0] == '<') and (c[-1] == '>') and (':' not in c):
+                    name = c[1:-1]
+                    t = tlv_types.__members__.get(name.upper())
+                    if (t is not None):
+                        steps.append(('typed', t, name))
+                    else:
+                        steps.append(('wild', None, name))
+                elif c.isdigit():
+                    steps.append(('literal',
+                                  bytes(TagTlv(tlv_types.INTEGER, int(c)).build()),
+                                  None))
+                else:
+                    steps.append(('literal', bytes(TagTlv(c).build()), None))
+        else:
+            for i, c in enumerate(pattern):
+                if (c is None):
+                    steps.append(('wild', None, '_{}'.format(i)))
+                elif isinstance(c, tlv_types):
+                    steps.append(('typed', c, c.name.lower()))
+                else:
+                    steps.append(('literal', bytes(TagTlv(c).build()), None))
+        return steps
+
+    def register(self, pattern, handler, prefix=False):
+        """
+        add handler for names matching pattern
+
+        With prefix=True the handler also matches names that continue
+        past the pattern (e.g. trailing OFFSET/SIZE tlvs). An exact match
+        is preferred over a prefix match.
+        """
+        node = self._root
+        names = []
+        for kind, key, name in self._compile(pattern):
+            node = node.child(kind, key)
+            if (kind != 'literal'):
+                names.append(name)
+        if (prefix):
+            node.prefix = (handler, names)
+        else:
+            node.exact = (handler, names)
+
+    def _match(self, node, views, i, caps):
+        """
+        depth first walk of the trie, literals tried before wildcards
+        """
+        if (i == len(views)):
+            if (node.exact):
+                return node.exact, caps, i
+        else:
+            v = views[i]
+            child = node.literal.get(v.raw().tobytes())
+            if (child):
+                found = self._match(child, views, i+1, caps)
+                if (found): return found
+            child = node.typed.get(v.tlv_type())
+            if (child):
+                found = self._match(child, views, i+1, caps + [v])
+                if (found): return found
+            if (node.wild):
+                found = self._match(node.wild, views, i+1, caps + [v])
+                if (found): return found
+        if (node.prefix):
+            return node.prefix, caps, i
+        return None
+
+    def resolve(self, name):
+        """
+        find the handler for name
+
+        name can be a TagMessage, FrozenTagName, TagName, TagTlvArray or
+        a bytearray of network formatted tlvs.
+
+        Returns (handler, params, rest) where params maps the wildcard
+        names to the values they matched and rest holds the TagTlvViews
+        past a prefix match. handler is the default (or None) when no
+        pattern matches.
+        """
+        if hasattr(name, 'name_key'):
+            name = name.name_key()
+        if not isinstance(name, FrozenTagName):
+            name = FrozenTagName(name)
+        views = list(name.views())
+        found = self._match(self._root, views, 0, [])
+        if (found is None):
+            return self.default, {}, views
+        (handler, names), caps, depth = found
+        params = dict(zip(names, [v.value() for v in caps]))
+        return handler, params, views[depth:]
+
+    def route(self, msg):
+        """
+        resolve the message name and call handler(msg, params)
+
+        Returns the handler's result, None when nothing handles msg.
+        """
+        handler, params, rest = self.resolve(msg)
+        if (handler is None):
+            return None
+        return handler(msg, params)
+
+#------------ end of class definition ---------------------
+
+def tagrouter_test():
+    r = TagRouter(default=lambda msg, params: 'default')
+    r.register('/<node_id>/tag/sd/0/dblk/byte/<n>', 'dblk', prefix=True)
+    r.register('/<node_id>/tag/sd/0/dblk/note', 'note')
+    r.register('/tag/poll/<node_id>/ev', 'poll')
+    nid = TagTlv(tlv_types.NODE_ID, 0x1fa3b2c4d5e6)
+    nm = TagTlvArray([nid, 'tag', 'sd', 0, 'dblk', 'byte', 0,
+                      (tlv_types.OFFSET, 100), (tlv_types.SIZE, 200)])
+    handler, params, rest = r.resolve(nm)
+    if (handler != 'dblk') or (params['n'] != 0) or (len(rest) != 2):
+        print('resolve dblk error: ', handler, params, rest)
+    handler, params, rest = r.resolve(TagTlvArray([nid, 'tag', 'sd', 0, 'dblk', 'note']))
+    if (handler != 'note') or (rest): print('resolve note error: ', handler, params)
+    handler, params, rest = r.resolve(TagName('/tag/poll') + TagTlv(tlv_types.NODE_ID, -1)
+                                      + TagTlv(tlv_types.STRING, 'ev'))
+    if (handler != 'poll'): print('resolve poll error: ', handler, params)
+    handler, params, rest = r.resolve(TagName('/tag/info'))
+    if (r.route(TagName('/tag/info')) != 'default'): print('default error: ', handler)
+    return r
+
+if __name__ == '__main__':
+    tagrouter_test()
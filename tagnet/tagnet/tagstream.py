@@ -0,0 +1,110 @@
+from __future__ import print_function   # python3 print function
+
+from tagdef import *
+from tagmessages import TagMessage, TagGet, TagPut, TagHead
+from tagnames import TagName
+from tagtlv import *
+
+__all__ = ['TagFrameSplitter', 'split_frames', 'read_frames']
+
+class TagFrameSplitter(object):
+    """
+    reassembles TagNet frames out of a continuous byte stream
+
+    Bytes are fed in chunks of any size (capture file, serial link,
+    socket). The first header byte (frame_length) gives the size of each
+    frame, 1 + frame_length bytes. Only the unfinished tail of the stream
+    is kept between chunks, complete frames are cut out as soon as they
+    are seen.
+
+    A header that cannot start a frame (shorter than the header, or a
+    name longer than the frame) is skipped one byte at a time until the
+    stream lines up again. Skipped bytes are counted in dropped.
+    """
+    def __init__(self, raw=False):
+        """
+        raw=True yields each frame as a bytearray instead of a TagMessage
+        """
+        self._buf = bytearray()
+        self._start = 0         # first byte of the next frame in _buf
+        self.raw = raw
+        self.dropped = 0
+
+    def feed(self, chunk):
+        """
+        add chunk to the stream, return a list of the frames it completes
+
+        The chunk is taken in when feed is called, frames still
+        unfinished are kept for the next chunk. Messages are lazily
+        parsed, only the header is decoded until the name or payload is
+        used.
+        """
+        self._buf += chunk
+        hs = TAGNET_HEADER_SIZE
+        frames = []
+        while (len(self._buf) - self._start >= hs):
+            start = self._start
+            n = self._buf[start] + 1
+            if (n < hs) or (self._buf[start+3] > n - hs):
+                self._start += 1                        # resync
+                self.dropped += 1
+                continue
+            if (len(self._buf) - start < n):
+                break                                   # partial frame
+            frame = self._buf[start:start+n]
+            self._start += n
+            frames.append(frame if (self.raw) else TagMessage(frame))
+        del self._buf[:self._start]
+        self._start = 0
+        return frames
+
+    def pending(self):
+        """
+        number of bytes held waiting for the rest of a frame
+        """
+        return len(self._buf) - self._start
+
+#------------ end of class definition ---------------------
+
+def split_frames(chunks, raw=False):
+    """
+    iterate over the messages in an iterable of byte chunks
+    """
+    splitter = TagFrameSplitter(raw)
+    for chunk in chunks:
+        for msg in splitter.feed(chunk):
+            yield msg
+
+def read_frames(f, size=4096, raw=False):
+    """
+    iterate over the messages read from a binary file object
+    """
+    return split_frames(iter(lambda: f.read(size), b''), raw)
+
+def tagstream_test():
+    msgs = [TagGet(TagName('/tag/sd/0/dblk/byte/0')
+                   + TagTlv(tlv_types.OFFSET, 512) + TagTlv(tlv_types.SIZE, 200)),
+            TagPut(TagName('/tag/sd/0/img/x'), bytearray(b'y' * 200)),
+            TagHead(TagName('/tag/sd/0/dblk/byte/.recnum'))]
+    stream = bytearray()
+    for msg in msgs:
+        stream += msg.build()
+    for size in (1, 7, 64, len(stream)):
+        chunks = [stream[i:i+size] for i in range(0, len(stream), size)]
+        got = list(split_frames(chunks))
+        if ([m.build() for m in got] != [m.build() for m in msgs]):
+            print('split error, chunk size: ', size)
+    splitter = TagFrameSplitter(raw=True)
+    got = list(splitter.feed(b'\x01\x00' + stream[:-10]))
+    if (len(got) != 2) or (splitter.dropped != 2) or (splitter.pending() != msgs[2].pkt_len() - 10):
+        print('resync error: ', len(got), splitter.dropped, splitter.pending())
+    got = list(splitter.feed(stream[-10:]))
+    if (len(got) != 1) or (got[0] != msgs[2].build()) or (splitter.pending()):
+        print('partial frame error: ', got)
+    splitter.feed(stream[:5])               # frames not taken still buffered
+    if (splitter.pending() != 5):
+        print('unconsumed feed error: ', splitter.pending())
+    return splitter
+
+if __name__ == '__main__':
+    tagstream_test()
@@ -5,11 +5,13 @@ import os, sys, types, platform
 from os.path import normpath, commonprefix
 #from temporenc import packb, unpackb
 from binascii import hexlify
-from struct import pack, unpack
+from struct import pack, unpack, Struct
+from struct import error as struct_error
 from datetime import datetime
 from uuid import getnode as get_mac
 import copy
 import unittest
+from array import array
 import enum
 import re
 
@@ -17,6 +19,9 @@ import re
 #
 __all__ = ['TagTlvList',
            'TagTlv',
+           'TagTlvView',
+           'TagTlvArray',
+           'tlv_views',
            'tlv_types',
            'tlv_errors',
            'TlvListBadException',
@@ -91,9 +96,29 @@ def int_to_tlv_type(idx):
     """
     Returns the network format (byte) value of TLV type
     """
-    for tlvt in tlv_types:
-        if (tlvt.value == idx): return tlvt
-    return None
+    return _tlv_type_table.get(idx)
+
+def tlv_views(fb, start=0):
+    """
+    Walk a network formatted string of tlvs, yielding a TagTlvView for each.
+
+    The frame is walked once through a single memoryview. No bytes are
+    copied until the value (or build) of an individual view is asked for.
+    Walking begins at start, view offsets are relative to fb.
+    """
+    if not isinstance(fb, bytearray):
+        fb = bytearray(fb)
+    mv = memoryview(fb)
+    x = start
+    end = len(fb)
+    while (x < end):
+        if ((x + 2) > end):
+            raise TlvListBadException(fb[x:])
+        y = fb[x+1] + 2
+        if ((x + y) > end):
+            raise TlvListBadException(fb[x:])
+        yield TagTlvView(fb, mv, x, y)
+        x += y
 
 #------------ end of general functions  ---------------------
 
@@ -115,6 +140,218 @@ class TlvListBadException(Exception):
 #------------ end of exception classes  ---------------------
 
 
+# Encode / Decode dispatch tables
+#
+# Each tlv type is mapped once, at import time, to its encoder and
+# decoder so that handling a tlv is a single dictionary lookup rather
+# than a scan of the type (or error) enumeration.
+#
+_tlv_type_table  = dict((t.value, t) for t in tlv_types)
+_tlv_error_table = dict((e.value, e) for e in tlv_errors)
+
+def _to_tlv(t, v):
+    """
+    add tlv header to network byte array
+    """
+    if isinstance(t, tlv_types):            # match any tlv_type
+        hdr = pack('BB', t.value, len(v))
+        return bytearray(hdr + bytearray(v))
+    raise TlvBadException(t, v)
+
+# integer tlvs hold the value big endian with leading zero bytes removed
+# (zero is a single 0 byte). Values up to 64 bits are packed in one go
+# with the header, then the unused leading bytes are cut out.
+_int_tlv_struct = Struct('>BBQ')
+_u16 = Struct('>H').unpack_from
+_u32 = Struct('>L').unpack_from
+_u64 = Struct('>Q').unpack_from
+
+# read the value of an integer tlv of each length in place, at offset 2
+_int_value_readers = {
+    1: lambda ba: ba[2],
+    2: lambda ba: _u16(ba, 2)[0],
+    3: lambda ba: (ba[2] << 16) | _u16(ba, 3)[0],
+    4: lambda ba: _u32(ba, 2)[0],
+    5: lambda ba: (ba[2] << 32) | _u32(ba, 3)[0],
+    6: lambda ba: (_u16(ba, 2)[0] << 32) | _u32(ba, 4)[0],
+    7: lambda ba: (((ba[2] << 16) | _u16(ba, 3)[0]) << 32) | _u32(ba, 5)[0],
+    8: lambda ba: _u64(ba, 2)[0],
+}
+
+def _to_tlv_int(t, v):
+    """
+    compress integer and add tlv header to network byte array
+    """
+    if (v < 0):
+        raise TlvBadException(t, v)
+    n = (v.bit_length() + 7) >> 3 or 1
+    if (n <= 8):
+        p = _int_tlv_struct.pack(t.value, n, v)
+        return bytearray(p[:2] + p[10-n:])
+    h = '%x' % v                            # wider than 64 bits
+    return _to_tlv(t, bytearray.fromhex(('0' * (len(h) & 1)) + h))
+
+def _encode_int(t, v):
+    if isinstance(v, types.IntType) or \
+       isinstance(v, types.LongType):
+        return _to_tlv_int(t, v)
+    raise TlvBadException(t, v)
+
+def _encode_error(t, v):
+    if isinstance(v, tlv_errors):
+        return _to_tlv_int(t, v.value)
+    raise TlvBadException(t, v)
+
+def _encode_string(t, v):
+    if isinstance(v, types.StringType) or \
+       isinstance(v, bytearray):
+        return _to_tlv(t, bytearray(v))
+    raise TlvBadException(t, v)
+
+def _encode_gps(t, v):
+    if isinstance(v, tuple) or isinstance(v, list):
+        return _to_tlv(t, bytearray(pack('<iii', *v)))
+    raise TlvBadException(t, v)
+
+def _encode_node_id(t, v):
+    ba = None
+    if isinstance(v, types.IntType) or\
+       isinstance(v, types.LongType):
+        ba = bytearray.fromhex(
+            ''.join('%02X' % ((v >> 8*i) & 0xff) for i in xrange(6)))
+    elif isinstance(v, types.StringType):
+        ba = bytearray.fromhex(v)
+    elif isinstance(v, bytearray):
+        ba = v
+    if (ba):
+        return _to_tlv(t, ba)
+    raise TlvBadException(t, v)
+
+def _encode_eof(t, v):
+    return _to_tlv(t, bytearray(''))
+
+def _encode_version(t, v):
+    if isinstance(v, list) or \
+       isinstance(v, tuple):
+        major, minor, build = v
+        ba = pack('HBB', int(build), int(minor), int(major))
+        return _to_tlv(t, bytearray(ba))
+    raise TlvBadException(t, v)
+
+def _decode_int(v):
+    """
+    Returns an integer from converting the network (byte string) value
+    """
+    acc = 0
+    for b in v: acc = (acc << 8) + b
+    return acc
+
+def _decode_int_tlv(ba):
+    """
+    Returns the integer value of a whole integer tlv, read in place
+    """
+    r = _int_value_readers.get(ba[1])
+    if (r):
+        return r(ba)
+    return _decode_int(ba[2:])
+
+def _decode_error(v):
+    """
+    Returns a tlv_errors type from converting the network (byte string) value
+    """
+    return _tlv_error_table.get(_decode_int(v))
+
+def _decode_version(v):
+    build, minor, major = unpack('HBB', v)
+    return (major, minor, build)
+
+_tlv_encoders = {
+    tlv_types.STRING:    _encode_string,
+    tlv_types.INTEGER:   _encode_int,
+    tlv_types.GPS:       _encode_gps,
+    tlv_types.TIME:      _to_tlv,
+    tlv_types.NODE_ID:   _encode_node_id,
+    tlv_types.NODE_NAME: _encode_string,
+    tlv_types.OFFSET:    _encode_int,
+    tlv_types.SIZE:      _encode_int,
+    tlv_types.EOF:       _encode_eof,
+    tlv_types.VERSION:   _encode_version,
+    tlv_types.BLOCK:     _to_tlv,
+    tlv_types.RECNUM:    _encode_int,
+    tlv_types.RECCNT:    _encode_int,
+    tlv_types.DELAY:     _encode_int,
+    tlv_types.ERROR:     _encode_error,
+    tlv_types.APP1:      _to_tlv,
+    tlv_types.APP2:      _to_tlv,
+}
+
+# decoders are handed a fresh slice of the tlv, so raw values are
+# returned as is
+_tlv_decoders = {
+    tlv_types.STRING:    bytearray,
+    tlv_types.INTEGER:   _decode_int,
+    tlv_types.GPS:       lambda v: list(unpack('<iii', v)),
+    tlv_types.TIME:      lambda v: v,
+    tlv_types.NODE_ID:   lambda v: v,
+    tlv_types.NODE_NAME: bytearray,
+    tlv_types.OFFSET:    _decode_int,
+    tlv_types.SIZE:      _decode_int,
+    tlv_types.EOF:       lambda v: bytearray(b''),
+    tlv_types.VERSION:   _decode_version,
+    tlv_types.BLOCK:     lambda v: v,
+    tlv_types.RECNUM:    _decode_int,
+    tlv_types.RECCNT:    _decode_int,
+    tlv_types.DELAY:     _decode_int,
+    tlv_types.ERROR:     _decode_error,
+    tlv_types.APP1:      lambda v: v,
+    tlv_types.APP2:      lambda v: v,
+}
+
+# decoded straight from the tlv buffer, see _decode_int_tlv. Checked by
+# type byte, hashing the enum costs more than the decode
+_int_tlv_values = frozenset(t.value for t in [tlv_types.INTEGER, tlv_types.OFFSET,
+                                             tlv_types.SIZE, tlv_types.RECNUM,
+                                             tlv_types.RECCNT, tlv_types.DELAY])
+
+def _build_tlv(t, v):
+    """
+    construct a network byte array from a type-value pair
+    """
+    try:
+        return _tlv_encoders[t](t, v)
+    except (KeyError, TypeError, ValueError, struct_error):
+        raise TlvBadException(t, v)
+
+def _build_value(ba):
+    """
+    construct a python object from network byte array
+    """
+    if (len(ba) < 2):
+        raise TlvBadException(ba, None)
+    if (len(ba) - 2 != ba[1]):
+        raise TlvBadException(int_to_tlv_type(ba[0]), ba[2:])
+    if (ba[0] in _int_tlv_values):
+        return _decode_int_tlv(ba)
+    t = int_to_tlv_type(ba[0])
+    try:
+        return _tlv_decoders[t](ba[2:])
+    except (KeyError, TypeError, ValueError, struct_error):
+        raise TlvBadException(t, ba[2:])
+
+def _parse_tlv(ba, copy=True):
+    """
+    verify a network byte array holds exactly one valid tlv and return a copy
+
+    copy=False returns ba itself, for callers that already own a private
+    copy of the bytes (e.g. from TagTlvView.build()).
+    """
+    if (_build_value(ba) is None):
+        raise TlvBadException(ba, None)
+    return bytearray(ba) if (copy) else ba
+
+#------------ end of dispatch tables  ---------------------
+
+
 class TagTlvList(list):
     """
     constructor for Tag TLV lists.
@@ -188,8 +425,14 @@ class TagTlvList(list):
     def copy(self):
         """
         make a copy of this tlvlist in a new tlvlist object
+
+        The new tlvs share the network bytes of the originals, nothing is
+        re-encoded. Since tlv bytes are never modified in place, updating
+        a tlv in either list leaves the other unchanged.
         """
-        return copy.deepcopy(self)
+        tl = self.__class__()
+        super(TagTlvList,tl).extend([TagTlv(tlv) for tlv in self])
+        return tl
 
     def endswith(self, d):
         """
@@ -200,11 +443,8 @@ class TagTlvList(list):
         """
         process nextwork formatted string of tlvs into a tagtlvlist. replaces current list
         """
-        x = 0
-        while (x < len(fb)):
-            y = fb[x+1] + 2
-            self.append(TagTlv(fb[x:x+y]))
-            x += y
+        for view in tlv_views(fb):
+            self.append(TagTlv(view))
 
     def pkt_len(self):  # needs fixup
         """
@@ -266,217 +506,265 @@ class TagTlvList(list):
 
 #------------ end of class definition ---------------------
 
-class _Tlv(object):
+class TagTlvArray(object):
     """
-    internal class for handling basic tlv manipulation
+    Array-backed alternative to TagTlvList.
 
-    returns none if operation fails
+    All tlvs are stored back to back, in network format, in one growable
+    bytearray plus an index of the offset where each tlv starts. Adding a
+    tlv appends its bytes to the buffer; no per-tlv objects are kept.
+
+    build() returns a read-only view of the buffer (no copy) and
+    pkt_len() is the buffer length. The buffer cannot be resized while
+    a view of it (from build() or views()) is alive, adding or deleting
+    a tlv then raises BufferError. Release the view first (del v), or
+    copy it (bytearray(v)) to keep it.
+
+    copy() is copy-on-write, the copy shares the buffer until one of
+    them is modified.
     """
-    def __init__(self, t, v=None):
+    __slots__ = ('_buf', '_offsets', '_shared')
+
+    def __init__(self, *args):
         """
-        Create basic Tlv object instance
+        initialize the tlv array
+
+        Accepts the same arguments as TagTlvList:
+        - no parameter      = empty array
+        - String            = path, each component is a string tlv
+        - bytearray         = network formatted tlvs, copied once
+        - TagTlvArray       = copy of the buffer
+        - list of TagTlvs, list of tuples or TagTlvList
+        More than one parameter is treated as a list of tlvs.
+        """
+        self._buf = bytearray()
+        self._offsets = array('L')
+        self._shared = False    # buffer also referenced by a copy
+        if (len(args) == 0):
+            pass
+        elif (len(args) == 1):
+            t = args[0]
+            try:
+                if isinstance(t, TagTlvArray):
+                    self._buf = bytearray(t._buf)
+                    self._offsets = array('L', t._offsets)
+                elif isinstance(t, types.StringType):
+                    for v in normpath(t).split(os.sep):
+                        if (v != ''):
+                            self._add(_build_tlv(tlv_types.STRING, v))
+                elif isinstance(t, bytearray):
+                    self._buf = bytearray(t)
+                    for view in tlv_views(self._buf):
+                        self._offsets.append(view.offset)
+                else:
+                    self.extend(t)
+            except (TlvBadException, TypeError):
+                raise TlvListBadException(args)
+        else:
+            try:
+                self.extend(args)
+            except (TlvBadException, TypeError):
+                raise TlvListBadException(args)
 
-        Translates from Python variable to TagTlv network
-        bytearray.
+    def _own(self):
+        """
+        take a private copy of a shared buffer before it is modified
+        """
+        if (self._shared):
+            self._buf = bytearray(self._buf)
+            self._offsets = array('L', self._offsets)
+            self._shared = False
+
+    def _add(self, ba):
+        self._own()
+        start = len(self._buf)
+        self._buf.extend(ba)            # BufferError if a view is alive
+        self._offsets.append(start)
+
+    def _span(self, i):
+        """
+        returns start and end of the i-th tlv in the buffer
+        """
+        start = self._offsets[i]
+        return start, start + self._buf[start+1] + 2
 
-        When only one parameter, use as bytearray in network
-        format and verify its validity.
+    def append(self, t):
+        """
+        encode the tlv (anything TagTlv() accepts) onto the end of the buffer
+        """
+        if isinstance(t, TagTlv):
+            self._add(t.mytlv)
+        elif isinstance(t, TagTlvView):
+            self._add(t.raw())
+        else:
+            self._add(TagTlv(t).mytlv)
 
-        Tlv is internally stored in the network format.
+    def extend(self, l):
+        """
+        append each tlv in l
+        """
+        if isinstance(l, TagTlvArray):
+            self._own()
+            base = len(self._buf)
+            self._buf.extend(l._buf)
+            self._offsets.extend(x + base for x in l._offsets)
+            return
+        for t in l:
+            self.append(t)
 
-        Can be retrieved in network format with self.build()
-        or as Python object with self.value()
+    def build(self):
         """
-        self.mytuple   = None
-        try:
-            self.mytuple = self._build_tlv(t, v)
-        except:
-            if (isinstance(t, bytearray)):
-                if (self._build_value(t) is not None):
-                    if (len(t[2:]) == t[1]):
-                        self.mytuple = copy.copy(t)
-        if (self.mytuple is None):
-            raise TlvBadException(t, v)
+        returns the network formatted tlvs as a read-only view (no copy)
 
-    def tlv_type(self):
+        The array cannot be modified until the view is released.
         """
-        returns value of the tlv type for this TLV
+        return memoryview(self._buf)
+
+    def copy(self):
         """
-        if (self.mytuple):
-            return int_to_tlv_type(self.mytuple[0])
-        return (tlv_types.None)
+        make a copy of this tlv array in a new object
 
-    def value(self):
+        The buffer is shared, not copied. Whichever of the two arrays is
+        modified first takes a private copy of the buffer at that point.
         """
-        returns the python object representing tlv value
+        tl = TagTlvArray()
+        tl._buf, tl._offsets = self._buf, self._offsets
+        tl._shared = self._shared = True
+        return tl
+
+    def pkt_len(self):
+        """
+        returns packet space required by the tlvs
         """
-        return self._build_value(self.mytuple)
+        return len(self._buf)
 
-    def build(self):
+    def startswith(self, d):
         """
-        returns the tlv network byte array
+        check to see if this name begins withs with specified name. True if prefix matches exactly.
         """
-        return bytearray(self.mytuple)
+        if isinstance(d, TagTlvArray):
+            d = d._buf
+        elif not isinstance(d, bytearray):
+            d = TagTlvList(d).build()
+        return self._buf[:len(d)] == d
 
-    def __len__(self):
+    def views(self):
         """
-        returns the length of tlv network byte array
+        iterate over the tlvs as TagTlvViews without copying
         """
-        if (self.mytuple):
-            return len(self.mytuple)
-        return 0
+        mv = memoryview(self._buf)
+        for i in range(len(self._offsets)):
+            start, end = self._span(i)
+            yield TagTlvView(self._buf, mv, start, end - start)
+
+    def _tlv(self, i):
+        """
+        returns the i-th tlv as a TagTlv, its bytes copied out once
+        """
+        start, end = self._span(i)
+        t = TagTlv.__new__(TagTlv)      # the slice is already a private copy
+        t.mytlv = _parse_tlv(self._buf[start:end], copy=False)
+        return t
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            tl = TagTlvArray()
+            for x in range(*i.indices(len(self))):
+                start, end = self._span(x)
+                tl._add(memoryview(self._buf)[start:end])
+            return tl
+        return self._tlv(i)
+
+    def __delitem__(self, i):
+        start, end = self._span(i)
+        n = end - start
+        self._own()
+        del self._buf[start:end]
+        i = i % len(self._offsets)
+        del self._offsets[i]
+        for x in range(i, len(self._offsets)):
+            self._offsets[x] -= n
+
+    def __iter__(self):
+        for i in range(len(self._offsets)):
+            yield self._tlv(i)
+
+    def __add__(self, other):
+        tl = self.copy()
+        if isinstance(other, (TagTlv, TagTlvView)):
+            tl.append(other)
+        else:
+            tl.extend(other)
+        return tl
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
 
     def __eq__(self, other):
-        return (self.mytuple == other.mytuple)
+        if isinstance(other, TagTlvArray):
+            return self._buf == other._buf
+        if isinstance(other, TagTlvList):
+            return self._buf == other.build()
+        return NotImplemented   # let other (e.g. FrozenTagName) compare
 
     def __ne__(self, other):
-        return not self.__eq__(other)
+        eq = self.__eq__(other)
+        return eq if (eq is NotImplemented) else not eq
 
-    def _to_tlv(self, t, v):
-        """
-        add tlv header to network byte array
-        """
-        # zzz print(type(t))
-        if isinstance(t, type(tlv_types.NONE)): # match any tlv_type
-            # zzz print('here')
-            hdr = pack('BB', t.value, len(v))
-            # zzz print(hexlify(hdr))
-            return bytearray(hdr + bytearray(v))
-        # zzz print('bad tlv')
-        raise TlvBadException(t, v)
+    def __repr__(self):
+        return repr(list(self))
 
-    def _to_tlv_int(self, t, v):
-        """
-        compress integer and add tlv header to network byte array
-        """
-        n = int(v)
-        p = pack('>L', n)
-        for i in range(0,4):
-            if (p[i] != '\x00'): break
-        return self._to_tlv(t, p[i:])
-
-    def _build_tlv(self, t, v):
-        """
-        construct a network byte array from a type-value pair
-        """
-        if (t == tlv_types.INTEGER) or \
-           (t == tlv_types.OFFSET) or \
-           (t == tlv_types.RECNUM) or \
-           (t == tlv_types.RECCNT) or \
-           (t == tlv_types.DELAY) or \
-           (t == tlv_types.SIZE):
-            if isinstance(v, types.IntType) or \
-               isinstance(v, types.LongType):
-                return self._to_tlv_int(t, v)
-
-        if (t == tlv_types.ERROR):
-            if isinstance(v, tlv_errors):
-                return self._to_tlv_int(t, v.value)
-
-        if (t == tlv_types.STRING)or \
-           (t == tlv_types.NODE_NAME):
-            if isinstance(v, types.StringType) or \
-               isinstance(v, bytearray):
-                return self._to_tlv(t, bytearray(v))
-
-        if (t == tlv_types.GPS):
-            if isinstance(v, tuple) or isinstance(v, list):
-                ba = pack('<iii', *v)
-                return self._to_tlv(t, bytearray(ba))
-
-        if (t == tlv_types.TIME):   return self._to_tlv(t, v)
-
-        if (t == tlv_types.NODE_ID):
-            if isinstance(v, types.IntType) or\
-               isinstance(v, types.LongType):
-                ba = bytearray.fromhex(
-                    ''.join('%02X' % ((v >> 8*i) & 0xff) for i in xrange(6)))
-            elif isinstance(v, types.StringType):
-                ba = bytearray.fromhex(v)
-            elif isinstance(v, bytearray):
-                ba = v
-            if (ba):
-                return self._to_tlv(t, ba)
-            raise TlvBadException(t, v)
+#------------ end of class definition ---------------------
 
-        if (t == tlv_types.EOF):    return self._to_tlv(t, bytearray(''))
 
-        if (t == tlv_types.VERSION):
-            # zzz print(type(v))
-            if isinstance(v, list) or \
-               isinstance(v, tuple):
-                major, minor, build = v
-                # zzz print(type(major),major,minor,build)
-                ba = pack('HBB', int(build), int(minor), int(major))
-                btlv = self._to_tlv(t, bytearray(ba))
-                # zzz print(btlv)
-                return btlv
+class TagTlvView(object):
+    """
+    Lightweight read-only view of a single tlv inside a network buffer
 
-        if (t == tlv_types.BLOCK) or \
-           (t == tlv_types.APP1)  or \
-           (t == tlv_types.APP2):
-            return self._to_tlv(t, v)
+    Holds only the location (offset, length) of the tlv within the frame
+    it was found in. Returned by tlv_views() when walking a received frame.
+    """
+    __slots__ = ('_buf', '_mv', 'offset', 'length')
 
-        raise TlvBadException(t, v)
+    def __init__(self, buf, mv, offset, length):
+        self._buf   = buf       # bytearray, indexes as integers
+        self._mv    = mv        # memoryview of buf, slices without copy
+        self.offset = offset    # start of tlv (type byte) in buf
+        self.length = length    # total tlv length, including header
 
-    def _build_value(self, ba):
+    def tlv_type(self):
         """
-        construct a python object from network byte array
+        returns value of the tlv type for this TLV
         """
-        def int_to_value(v):
-            """
-            Returns an integer from converting the network (byte string) value
-            """
-            try:
-                acc = 0
-                for i in range(l): acc = (acc << 8) + v[i]
-                return acc
-            except:
-                return None
+        return int_to_tlv_type(self._buf[self.offset])
 
-        def err_to_value(v):
-            """
-            Returns a tlv_errors type from converting the network (byte string) value
-            """
-            try:
-                acc = 0
-                err = tlv_errors.SUCCESS
-                for i in range(l): acc = (acc << 8) + v[i]
-                for n in tlv_errors.__dict__['_member_names_']:
-                    err = eval('tlv_errors.'+n)
-                    if err.value == acc:
-                        return err
-                return none
-            except:
-                return None
-
-        if (len(ba) < 2):
-            raise TlvBadException(ba, None)
-        t = int_to_tlv_type(ba[0])
-        l = ba[1]
-        v = ba[2:]
-        if (len(v) != l):
-            raise TlvBadException(t, v)
-        if (t == tlv_types.INTEGER):   return int_to_value(v)
-        if (t == tlv_types.STRING):    return bytearray(v)
-        if (t == tlv_types.GPS):       return list(unpack('<iii', v))
-        if (t == tlv_types.TIME):      return v
-        if (t == tlv_types.NODE_ID):   return v
-        if (t == tlv_types.NODE_NAME): return bytearray(v)
-        if (t == tlv_types.OFFSET):    return int_to_value(v)
-        if (t == tlv_types.SIZE):      return int_to_value(v)
-        if (t == tlv_types.EOF):       return bytearray(b'')
-        if (t == tlv_types.VERSION):
-            build, minor, major = unpack('HBB', v)
-            return (major, minor, build)
-        if (t == tlv_types.BLOCK):     return copy.deepcopy(v)
-        if (t == tlv_types.RECNUM):    return int_to_value(v)
-        if (t == tlv_types.RECCNT):    return int_to_value(v)
-        if (t == tlv_types.DELAY):     return int_to_value(v)
-        if (t == tlv_types.ERROR):     return err_to_value(v)
-        if (t == tlv_types.APP1):      return copy.deepcopy(v)
-        if (t == tlv_types.APP2):      return copy.deepcopy(v)
-        raise TlvBadException(t, v)
+    def raw(self):
+        """
+        returns a memoryview of the tlv network bytes (no copy)
+        """
+        return self._mv[self.offset:self.offset+self.length]
+
+    def build(self):
+        """
+        returns a copy of the tlv network byte array
+        """
+        return bytearray(self.raw())
+
+    def value(self):
+        """
+        returns the python object representing tlv value
+        """
+        return _build_value(self.build())
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return '({}, @{}:{})'.format(self.tlv_type(), self.offset, self.length)
 
 #------------ end of class definition ---------------------
 
@@ -487,7 +775,13 @@ class TagTlv(object):
 
     Handles the translation between network format and
     python types.
+
+    The tlv is held in a single slot in its network format (type,
+    length, value bytes). That bytearray is never modified in place,
+    so tlvs copied from one another share it.
     """
+    __slots__ = ('mytlv',)
+
     def __init__(self, t=None, v=None):
         """
         initializes the specified TLV type and value
@@ -506,27 +800,30 @@ class TagTlv(object):
         - bytearray         = parse network format to tlv
         - tuple(t,v)        = convert tuple(tlv, value) to tlv
         - TagTlv            = create new tlv, copy type/value
+        - TagTlvView        = copy tlv out of a network buffer
         """
-        self.mytlv = None  # value of tlv associated with this object
+        self.mytlv = None  # network format bytearray of this tlv
         if (t is None) and (v is None):       # no parameters
             pass                              #  empty list
         elif (t is not None and v is not None): # two parameters
-            self.mytlv = _Tlv(t,v)              #  tuple
+            self.mytlv = _build_tlv(t,v)        #  tuple
         elif (v is None):                     # one parameter
             if isinstance(t, types.IntType) or \
                isinstance(t, types.LongType):       # Integer
-                self.mytlv = _Tlv(tlv_types.INTEGER, t)
+                self.mytlv = _build_tlv(tlv_types.INTEGER, t)
             elif isinstance(t, types.StringType):     # String
                 self.mytlv = self._regex_tlv(t) if (t[0] is '<') \
-                      else _Tlv(tlv_types.STRING, t)
+                      else _build_tlv(tlv_types.STRING, t)
             elif isinstance(t, bytearray):            # bytearray
-                self.mytlv = _Tlv(t)
+                self.mytlv = _parse_tlv(t)
             elif isinstance(t, types.TupleType):      # Tuple
-                self.mytlv = _Tlv(t[0], t[1])
+                self.mytlv = _build_tlv(t[0], t[1])
             elif (isinstance(t, TagTlv)):             # TagTlv
-                self.mytlv = _Tlv(t.tlv_type(), t.value())
+                self.mytlv = t.mytlv
+            elif (isinstance(t, TagTlvView)):         # TagTlvView
+                self.mytlv = _parse_tlv(t.build(), copy=False)
             elif (t == tlv_types.EOF):
-                self.mytlv = _Tlv(t, bytearray(b''))
+                self.mytlv = _build_tlv(t, bytearray(b''))
         if (self.mytlv is None):
             raise TlvBadException(t, v)
 
@@ -539,8 +836,8 @@ class TagTlv(object):
                            buf.upper())[0]
             # zzz print(key, major, minor, build)
             if (key == 'VERSION'):
-                return _Tlv(tlv_types.VERSION,
-                            (int(major),int(minor),int(build)))
+                return _build_tlv(tlv_types.VERSION,
+                                  (int(major),int(minor),int(build)))
         except IndexError, ValueError:
             pass
         try:
@@ -550,54 +847,55 @@ class TagTlv(object):
                                     buf.upper())[0]
             # zzz print(key, type(value), value)
             if (key == 'NODE_ID'):
-                return _Tlv(tlv_types.NODE_ID,
-                            value)
+                return _build_tlv(tlv_types.NODE_ID,
+                                  value)
         except IndexError, ValueError:
-            raise TlvBadException(t, v)
+            raise TlvBadException(buf, None)
         return None # shouldn't get here
 
     def copy(self):
-        return copy.deepcopy(self)
+        return TagTlv(self)
 
     def update(self, t, v=None):
         """
         modify existing type and value fields of object
         """
         if (v):
-            self.mytlv = _Tlv(t, v)
-            if (self.mytlv):
-                return
+            self.mytlv = _build_tlv(t, v)
+            return
         if isinstance(t, TagTlv):
-            self.mytlv = _Tlv(t.tlv_type(),t.value())
-            if (self.mytlv):
-                return
+            self.mytlv = t.mytlv
+            return
         if isinstance(t, types.TupleType):
-            self.mytlv = _Tlv(t[0],t[1])
-            if (self.mytlv):
-                return
+            self.mytlv = _build_tlv(t[0],t[1])
+            return
         raise TlvBadException(t, v)
 
     def parse(self, ba):
         """
         parse network formatted tlv into object instance
         """
-        self.mytlv = _Tlv(ba)
-        if (self.mytlv is None):
-            raise TlvBadException(self.mytlv, None)
+        self.mytlv = _parse_tlv(ba)
 
     def build(self):
         """
         build a network formatted tlv from object instance
         """
         if (self.mytlv):
-            return self.mytlv.build()
+            return bytearray(self.mytlv)
         raise TlvBadException(self.mytlv, None)
 
     def tlv_type(self):
-        return self.mytlv.tlv_type()
+        return int_to_tlv_type(self.mytlv[0])
 
     def value(self):
-        return self.mytlv.value()
+        return _build_value(self.mytlv)
+
+    def __getstate__(self):
+        return self.mytlv
+
+    def __setstate__(self, state):
+        self.mytlv = state
 
     def __add__(self, other):
         if isinstance(other, TagTlv):
@@ -608,23 +906,22 @@ class TagTlv(object):
 
     def __eq__(self, other):
         return (isinstance(other, self.__class__) and
-                self.mytlv.__eq__(other.mytlv))
-#            and self.__dict__ == other.__dict__)
+                self.mytlv == other.mytlv)
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __repr__(self):
         try:
-            v = self.mytlv.value()
+            v = self.value()
             if (self.tlv_type() == tlv_types.NODE_ID):
                 v = hexlify(v)
-            return '({}, {})'.format(self.mytlv.tlv_type(),v)
+            return '({}, {})'.format(self.tlv_type(),v)
         except:
             raise TlvBadException(self.mytlv, None)
 
     def __len__(self):
-        return self.mytlv.__len__()
+        return len(self.mytlv)
 
 #------------ end of class definition ---------------------
 
@@ -717,6 +1014,26 @@ class TestTlvMethods(unittest.TestCase):
         tsz.parse(self.tstr.build())
         self.assertNotEqual(tsz.value(), TagTlv(osz).value())
 
+#    @unittest.skip("skip integer wire format")
+    def test_tlv_int_wire(self):
+        def packed(t, n):           # 32 bit wire format, leading zeros cut
+            p = pack('>L', n)
+            i = min([i for i in range(3) if p[i] != '\x00'] + [3])
+            return bytearray(pack('BB', t.value, 4 - i) + p[i:])
+        for t in [tlv_types.INTEGER, tlv_types.OFFSET, tlv_types.SIZE,
+                  tlv_types.RECNUM, tlv_types.RECCNT, tlv_types.DELAY]:
+            for n in [0, 1, 0xff, 0x100, 0xffff, 0x10000, 129000, 0xffffffff]:
+                self.assertEqual(TagTlv(t, n).build(), packed(t, n))
+                self.assertEqual(TagTlv(packed(t, n)).value(), n)
+        for n in [2**32, 2**40 + 5, 2**64 - 1, 2**64, 2**100 + 3]:
+            tlv = TagTlv(tlv_types.OFFSET, n)
+            self.assertEqual(tlv.value(), n)
+            self.assertEqual(len(tlv), 2 + (n.bit_length() + 7) // 8)
+            self.assertEqual(TagTlvList(tlv.build())[0].value(), n)
+        self.assertEqual(TagTlv(bytearray(b'\x07\x03\x01\xf7\xe8')).value(), 129000)
+        with self.assertRaises(TlvBadException):
+            TagTlv(tlv_types.SIZE, -1)
+
 #    @unittest.skip("skip eof")
     def test_tlv_eof(self):
         teof = TagTlv(tlv_types.EOF)
@@ -759,6 +1076,11 @@ class TestTlvMethods(unittest.TestCase):
         ttlv = TagTlv(self.tstr)
         tclv = TagTlv(ttlv)
         self.assertEqual(ttlv, tclv)
+        self.assertFalse(hasattr(tclv, '__dict__'))
+        self.assertIs(ttlv.mytlv, tclv.mytlv)
+        tclv.update(tlv_types.INTEGER, 5)
+        self.assertNotEqual(ttlv, tclv)
+        self.assertEqual(ttlv.value(), 'abc')
 
 #    @unittest.skip("skip __init__ using bytearray")
     def test_tlv_init_bytearray(self):
@@ -865,6 +1187,97 @@ class TestTlvListMethods(unittest.TestCase):
         tl += [TagTlv('bar')]
         self.assertEqual(self.tlstr, tl)
 
+#    @unittest.skip("skip walk tlv views")
+    def test_tlvlist_views(self):
+        ob = TagTlvList([(tlv_types.STRING, 'tag'),
+                         (tlv_types.OFFSET, 129000),
+                         (tlv_types.EOF, bytearray(b''))]).build()
+        views = list(tlv_views(ob))
+        self.assertEqual([v.tlv_type() for v in views],
+                         [tlv_types.STRING, tlv_types.OFFSET, tlv_types.EOF])
+        self.assertEqual([v.offset for v in views], [0, 5, 10])
+        self.assertEqual(views[1].value(), 129000)
+        self.assertEqual(TagTlv(views[0]), TagTlv(tlv_types.STRING, 'tag'))
+        self.assertEqual(TagTlvList(ob), TagTlvList([TagTlv(v) for v in views]))
+        with self.assertRaises(TlvListBadException):
+            list(tlv_views(ob[:-3]))
+        tl = TagTlvList(ob)
+        ob[2] = ord('x')                # parsed tlvs own their bytes
+        self.assertEqual(tl[0].value(), 'tag')
+
+#    @unittest.skip("skip copy a tlvlist")
+    def test_tlvlist_copy(self):
+        tl = self.tlstr.copy()
+        self.assertEqual(self.tlstr, tl)
+        self.assertIs(tl[0].mytlv, self.tlstr[0].mytlv)
+        tl[0].update(tlv_types.INTEGER, 5)
+        tl.append(TagTlv('baz'))
+        self.assertEqual(self.tlstr, TagTlvList('/foo/bar'))
+
+
+class TestTlvArrayMethods(unittest.TestCase):
+    def setUp(self):
+        self.tlstr = TagTlvList('/foo/bar')
+        self.tastr = TagTlvArray('/foo/bar')
+
+#    @unittest.skip("skip __init__ string")
+    def test_tlvarray_init(self):
+        self.assertEqual(self.tastr, self.tlstr)
+        self.assertEqual(self.tastr, TagTlvArray(self.tlstr))
+        self.assertEqual(self.tastr, TagTlvArray(self.tlstr.build()))
+        self.assertEqual(self.tastr, TagTlvArray('foo', 'bar'))
+        self.assertEqual(len(self.tastr), 2)
+
+#    @unittest.skip("skip build and pkt_len")
+    def test_tlvarray_build(self):
+        self.tastr.extend([TagTlv(tlv_types.OFFSET, 45678),
+                           (tlv_types.SIZE, 200)])
+        self.tlstr.extend([TagTlv(tlv_types.OFFSET, 45678),
+                           (tlv_types.SIZE, 200)])
+        self.assertEqual(bytearray(self.tastr.build()), self.tlstr.build())
+        self.assertEqual(self.tastr.pkt_len(), self.tlstr.pkt_len())
+        self.assertEqual(self.tastr[2].value(), 45678)
+        self.assertEqual(list(self.tastr), list(self.tlstr))
+        ob = self.tastr.build()
+        with self.assertRaises(BufferError):
+            self.tastr.append(TagTlv('baz'))
+        self.assertEqual(len(self.tastr), 4)
+        del ob
+        self.tastr.append(TagTlv('baz'))
+        self.assertEqual(len(self.tastr), 5)
+
+#    @unittest.skip("skip delete and startswith")
+    def test_tlvarray_del(self):
+        ta = self.tastr + TagTlv(tlv_types.INTEGER, 1)
+        self.assertTrue(ta.startswith(self.tastr))
+        self.assertFalse(self.tastr.startswith(ta))
+        del ta[0]
+        self.assertEqual(ta, TagTlvArray(['bar', (tlv_types.INTEGER, 1)]))
+        self.assertEqual([v.offset for v in ta.views()], [0, 5])
+
+#    @unittest.skip("skip item access")
+    def test_tlvarray_items(self):
+        ta = self.tastr + TagTlv(tlv_types.INTEGER, 1)
+        self.assertEqual(ta[1:], TagTlvArray(['bar', (tlv_types.INTEGER, 1)]))
+        self.assertEqual(ta[::2], TagTlvArray(['foo', (tlv_types.INTEGER, 1)]))
+        items = list(ta) + [ta[0]]
+        ta.append(TagTlv('baz'))        # items hold no view of the buffer
+        ta._buf[2] = ord('g')
+        self.assertEqual([t.value() for t in items], ['foo', 'bar', 1, 'foo'])
+
+#    @unittest.skip("skip copy-on-write")
+    def test_tlvarray_copy(self):
+        ta = self.tastr.copy()
+        self.assertIs(ta._buf, self.tastr._buf)
+        ob = self.tastr.build()
+        ta.append(TagTlv(tlv_types.INTEGER, 1))
+        self.assertIsNot(ta._buf, self.tastr._buf)
+        self.assertEqual(bytearray(ob), self.tlstr.build())
+        self.assertEqual(self.tastr, self.tlstr)
+        del ta[0]
+        self.assertEqual(ta, TagTlvArray(['bar', (tlv_types.INTEGER, 1)]))
+        self.assertEqual(self.tastr, self.tlstr)
+
 
 if __name__ == '__main__':
     unittest.main()
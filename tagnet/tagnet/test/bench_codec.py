@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the tagnet codec
+
+Covers TagTlv encode/decode for every tlv type, TagTlvList build and
+parse, TagName construction and TagMessage build/parse for each message
+type. For each benchmark reports ops/sec and the objects and bytes held
+by its result.
+
+Results are compared to the baseline saved in bench_baseline.json
+(ops/sec scaled to this machine, see benchutil). The suite is run
+--rounds times and the best ops/sec of each benchmark kept. The exit
+status is 1 if the objects or bytes of any result grew; a drop in
+ops/sec is printed as a warning, and only fails with --strict. Run
+from the tagnet package directory:
+    python -m tagnet.test.bench_codec             compare to baseline
+    python -m tagnet.test.bench_codec --save      save a new baseline
+"""
+from __future__ import print_function
+
+import argparse, os, platform, sys
+
+from tagnet import TagTlv, TagTlvList, TagName, tlv_types, tlv_errors
+from tagnet import TagMessage, TagGet, TagPut, TagHead
+
+from tagnet.test.benchutil import per_op, footprint, reference_ops, best_of
+from tagnet.test.benchutil import save_baseline, load_baseline, compare
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'bench_baseline.json')
+
+# a value for every tlv type
+TLV_SAMPLES = {
+    tlv_types.NONE:      None,                  # not encodable
+    tlv_types.STRING:    'dblk',
+    tlv_types.INTEGER:   12345,
+    tlv_types.GPS:       (-2702906, -4321156, 3821852),
+    tlv_types.TIME:      'Sat Oct 14 10:12:44 2017',
+    tlv_types.NODE_ID:   0x1fa3b2c4d5e6,
+    tlv_types.NODE_NAME: 'tagmaster',
+    tlv_types.OFFSET:    129000,
+    tlv_types.SIZE:      512,
+    tlv_types.EOF:       bytearray(b''),
+    tlv_types.VERSION:   (1, 16, 0),
+    tlv_types.BLOCK:     bytearray(b'x' * 200),
+    tlv_types.RECNUM:    20301,
+    tlv_types.RECCNT:    16,
+    tlv_types.DELAY:     300,
+    tlv_types.ERROR:     tlv_errors.EODATA,
+    tlv_types.APP1:      bytearray(b'app1'),
+    tlv_types.APP2:      bytearray(b'app2'),
+}
+
+NAME_STRING = '/tag/sd/0/dblk/byte/0'
+NAME_PATH = ['<node_id:1fa3b2c4d5e6>', 'tag', 'sd', 0, 'dblk', 'byte', 0]
+
+def _path_tlvs(path):
+    return [TagTlv(tlv_types.INTEGER, p) if isinstance(p, int) else TagTlv(p)
+            for p in path]
+
+def _poll():
+    # shaped like TagPoll; it and TagBeacon cannot encode a datetime TIME
+    msg = TagMessage(TagName('/tag/poll') + TagTlv(tlv_types.NODE_ID, -1)
+                     + TagTlv(tlv_types.STRING, 'ev'),
+                     TagTlvList([(tlv_types.TIME, TLV_SAMPLES[tlv_types.TIME]),
+                                 (tlv_types.INTEGER, 100),
+                                 (tlv_types.INTEGER, 10),
+                                 (tlv_types.NODE_ID, 0x1fa3b2c4d5e6),
+                                 (tlv_types.NODE_NAME, 'tagmaster')]))
+    msg.header.options.message_type = 'POLL'
+    return msg
+
+def _beacon():
+    msg = TagMessage(TagName('/tag/beacon') + TagTlv(tlv_types.NODE_ID, -1),
+                     TagTlvList([(tlv_types.NODE_ID, 0x1fa3b2c4d5e6),
+                                 (tlv_types.NODE_NAME, 'tagmaster'),
+                                 (tlv_types.TIME, TLV_SAMPLES[tlv_types.TIME])]))
+    msg.header.options.message_type = 'BEACON'
+    return msg
+
+def _messages():
+    name = TagName(NAME_STRING)
+    return [('get',    lambda: TagGet(name + TagTlv(tlv_types.OFFSET, 512)
+                                      + TagTlv(tlv_types.SIZE, 200))),
+            ('put',    lambda: TagPut(name, bytearray(b'x' * 200))),
+            ('head',   lambda: TagHead(name)),
+            ('poll',   _poll),
+            ('beacon', _beacon)]
+
+def benchmarks():
+    """
+    returns a list of (name, fn), fn returns the object it produced
+    """
+    benches = []
+    for t in tlv_types:
+        v = TLV_SAMPLES[t]
+        if (v is None):
+            continue
+        ob = TagTlv(t, v).build()
+        benches.append(('tlv_encode_' + t.name.lower(),
+                        lambda t=t, v=v: TagTlv(t, v)))
+        benches.append(('tlv_decode_' + t.name.lower(),
+                        lambda ob=ob: TagTlv(ob).value()))
+    tl = TagTlvList(_path_tlvs(NAME_PATH)
+                    + [TagTlv(tlv_types.OFFSET, 129000), TagTlv(tlv_types.SIZE, 200)])
+    ob = tl.build()
+    benches.append(('tlvlist_build', tl.build))
+    benches.append(('tlvlist_parse', lambda ob=ob: TagTlvList(ob)))
+    benches.append(('name_string', lambda: TagName(NAME_STRING)))
+    benches.append(('name_path', lambda: TagName(_path_tlvs(NAME_PATH))))
+    for label, make in _messages():
+        ob = make().build()
+        benches.append(('msg_build_' + label, lambda make=make: make().build()))
+        benches.append(('msg_parse_' + label, lambda ob=ob: TagMessage(ob)))
+        benches.append(('msg_decode_' + label,
+                        lambda ob=ob: _decoded(TagMessage(ob))))
+    return benches
+
+def _decoded(msg):
+    msg.name, msg.payload           # force the lazy decode
+    return msg
+
+def run(only=None):
+    """
+    run the benchmarks (those whose name starts with only), returns
+    {name: {ops, objects, bytes}}
+    """
+    results = {}
+    for name, fn in benchmarks():
+        if (only) and not name.startswith(only):
+            continue
+        t = per_op(fn)
+        objects, size = footprint([fn()])
+        results[name] = {'ops': 1.0 / t, 'objects': objects, 'bytes': size}
+    return results
+
+def report(results):
+    print('{:<24} {:>12} {:>8} {:>8}'.format('benchmark', 'ops/sec',
+                                              'objects', 'bytes'))
+    for name in sorted(results):
+        r = results[name]
+        print('{:<24} {:>12.0f} {:>8} {:>8}'.format(name, r['ops'],
+                                                     r['objects'], r['bytes']))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='tagnet codec benchmarks')
+    parser.add_argument('--save', action='store_true',
+                        help='save results as the new baseline')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='baseline file (default: %(default)s)')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed drop in ops/sec (default: %(default)s)')
+    parser.add_argument('--only', default=None,
+                        help='run benchmarks whose name starts with this')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='runs of the suite, best kept (default: %(default)s)')
+    parser.add_argument('--strict', action='store_true',
+                        help='fail on a drop in ops/sec too')
+    args = parser.parse_args(argv)
+    reference = reference_ops()
+    runs = []
+    for _ in range(max(args.rounds, 1)):
+        runs.append(run(args.only))
+        reference = max(reference, reference_ops())
+    results = best_of(runs)
+    report(results)
+    if (args.save):
+        save_baseline(args.baseline, results, reference)
+        print('baseline saved:', args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print('no baseline, run with --save to create one')
+        return 0
+    baseline = load_baseline(args.baseline)
+    if (baseline['python'] != platform.python_version()):
+        print('baseline is from python', baseline['python'])
+    regressions, slowdowns = compare(results, baseline, reference,
+                                     args.tolerance)
+    for r in regressions:
+        print('REGRESSION', r)
+    for r in slowdowns:
+        print('SLOWER', r)
+    if (args.strict):
+        regressions += slowdowns
+    return 1 if (regressions) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Benchmark of message construction and copying for a 1 MB image upload
+
+Builds the PUT requests the way radioimage.im_put_file does (one per
+chunk, name plus OFFSET, raw payload) and keeps each request along
+with a copy of it, as a sender holding requests for retransmission
+would. Names are built either from the cached prefix or as a TagName
+per chunk.
+
+Reports the time per upload and the objects and bytes held by the
+requests. Objects shared between messages are counted once.
+
+Run from the tagnet package directory:
+    python -m tagnet.test.bench_copy
+"""
+from __future__ import print_function
+
+import timeit
+
+from tagnet import TagName, TagNamePrefix, TagPut, TagTlv, tlv_types
+
+from tagnet.test.benchutil import footprint
+
+IMAGE_SIZE = 1024 * 1024
+PATH = ('<node_id:1fa3b2c4d5e6>', 'tag', 'sd', '0', 'img', '<version:1.16.0>')
+
+def _path_tlvs():
+    return [TagTlv(p) if (p[0] == '<') else
+            TagTlv(tlv_types.INTEGER, int(p)) if p.isdigit() else TagTlv(p)
+            for p in PATH]
+
+_PREFIX = TagNamePrefix(_path_tlvs())
+
+def prefix_name(offset):
+    return _PREFIX.extend(TagTlv(tlv_types.OFFSET, offset))
+
+def tagname_name(offset):
+    return TagName(_path_tlvs()) + TagTlv(tlv_types.OFFSET, offset)
+
+def upload(buf, name, keep=None):
+    """
+    build every request of the upload, append it and a copy to keep
+    """
+    mv = memoryview(buf)
+    offset = 0
+    while (offset < len(buf)):
+        msg = TagPut(name(offset))
+        msg.payload = bytearray(mv[offset:offset+msg.payload_avail()])
+        msg.build()
+        if (keep is not None):
+            keep.append((msg, msg.copy()))
+        offset += len(msg.payload)
+    return offset
+
+def run(number=3):
+    """
+    report msec per 1 MB upload and the footprint of the kept requests
+    """
+    buf = bytearray(b'x' * IMAGE_SIZE)
+    results = []
+    print('{:<8} {:>9} {:>10} {:>10} {:>10}'.format(
+        'name', 'requests', 'msec', 'objects', 'KB'))
+    for label, name in [('prefix', prefix_name), ('tagname', tagname_name)]:
+        best = min(timeit.repeat(lambda: upload(buf, name, []),
+                                 number=number, repeat=3))
+        keep = []
+        upload(buf, name, keep)
+        count, size = footprint(keep)
+        results.append((label, len(keep), (best / number) * 1e3, count, size))
+        print('{:<8} {:>9} {:>10.1f} {:>10} {:>10.1f}'.format(
+            label, len(keep), (best / number) * 1e3, count, size / 1024.0))
+    return results
+
+if __name__ == '__main__':
+    run()
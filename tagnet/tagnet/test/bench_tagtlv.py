@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for per-TLV encode/decode cost
+
+Run from the tagnet package directory:
+    python -m tagnet.test.bench_tagtlv
+"""
+from __future__ import print_function
+
+import timeit
+
+from tagnet import TagTlv, tlv_types, tlv_errors
+
+SAMPLES = [(tlv_types.STRING,    'dblk'),
+           (tlv_types.INTEGER,   12345),
+           (tlv_types.OFFSET,    129000),
+           (tlv_types.SIZE,      512),
+           (tlv_types.NODE_ID,   0x1fa3b2c4d5e6),
+           (tlv_types.NODE_NAME, 'tagmaster'),
+           (tlv_types.VERSION,   (1, 16, 0)),
+           (tlv_types.ERROR,     tlv_errors.EODATA),
+           (tlv_types.BLOCK,     bytearray(b'x' * 200)),
+           (tlv_types.EOF,       bytearray(b'')),
+]
+
+def _per_op(stmt, number):
+    best = min(timeit.repeat(stmt, number=number, repeat=3))
+    return (best / number) * 1e6    # microseconds
+
+def run(number=2000):
+    """
+    report per-TLV cost (usec) of encode, decode and type lookup
+    """
+    results = []
+    for t, v in SAMPLES:
+        ob = TagTlv(t, v).build()
+        enc = _per_op(lambda: TagTlv(t, v), number)
+        dec = _per_op(lambda: TagTlv(ob).value(), number)
+        typ = _per_op(lambda: TagTlv(ob).tlv_type(), number)
+        results.append((t.name, enc, dec, typ))
+    print('{:<10} {:>10} {:>10} {:>10}'.format('tlv', 'encode', 'decode', 'type'))
+    for name, enc, dec, typ in results:
+        print('{:<10} {:>10.2f} {:>10.2f} {:>10.2f}'.format(name, enc, dec, typ))
+    return results
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,119 @@
+"""
+Helpers shared by the tagnet benchmarks
+
+Timing, the memory footprint of results, and saving/comparing results
+against a baseline file.
+
+Timings are saved together with the speed of a fixed pure python
+workload measured in the same run. Comparisons scale the baseline by
+how fast that reference ran, which cancels most of the difference
+between machines. A busy host still slows single runs unevenly, so
+suites are run several rounds and the best of each timing is kept
+(best_of), and a drop in speed is reported as a warning apart from
+the object and byte counts, which do not vary between runs.
+"""
+from __future__ import print_function
+
+import gc, json, platform, sys, types
+import timeit
+
+import enum
+from struct import pack
+
+def per_op(fn, min_time=0.05, repeat=5):
+    """
+    returns the best time (seconds) of one call to fn
+
+    The loop count is doubled until one timing run takes min_time.
+    """
+    number = 1
+    while (timeit.timeit(fn, number=number) < min_time):
+        number *= 2
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+def _reference_work():
+    ba = bytearray()
+    for i in range(64):
+        ba.extend(pack('>HBB', i, i & 0xff, 7))
+    return [x for x in ba if x]
+
+def reference_ops():
+    """
+    ops/sec of the reference workload on this machine, right now
+    """
+    return 1.0 / per_op(_reference_work)
+
+def best_of(runs):
+    """
+    merge several runs of {name: {ops, ...}}, keeping the best ops/sec
+    """
+    best = {}
+    for results in runs:
+        for name, r in results.items():
+            if (name not in best) or (r['ops'] > best[name]['ops']):
+                best[name] = r
+    return best
+
+def footprint(objs):
+    """
+    count the distinct objects reachable from objs and their size
+
+    Objects shared between several of objs are counted once. Classes,
+    modules and enum members are not counted.
+    """
+    seen = set()
+    stack = list(objs)
+    count = size = 0
+    while (stack):
+        o = stack.pop()
+        if (id(o) in seen) or \
+           isinstance(o, (type, types.ModuleType, enum.Enum)):
+            continue
+        seen.add(id(o))
+        count += 1
+        size += sys.getsizeof(o)
+        stack.extend(gc.get_referents(o))
+    return count, size
+
+def save_baseline(path, results, reference):
+    """
+    write results {name: {ops, objects, bytes}} as the baseline
+    """
+    results = dict((name, dict(r, ops=round(r['ops'])))
+                   for name, r in results.items())
+    with open(path, 'w') as f:
+        json.dump({'python': platform.python_version(),
+                   'reference': round(reference),
+                   'results': results}, f, indent=1, sort_keys=True,
+                  separators=(',', ': '))
+        f.write('\n')
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+def compare(results, baseline, reference, tolerance=0.5):
+    """
+    returns (regressions, slowdowns) of results against the baseline
+
+    A benchmark regresses when its result holds more objects or bytes.
+    It is slower when its ops/sec, scaled by the reference speed, drops
+    by more than tolerance. Benchmarks missing from either side are
+    ignored.
+    """
+    regressions = []
+    slowdowns = []
+    base = baseline['results']
+    scale = reference / baseline['reference']
+    for name in sorted(results):
+        if (name not in base):
+            continue
+        now, was = results[name], base[name]
+        if (now['ops'] < was['ops'] * scale * (1 - tolerance)):
+            slowdowns.append('{}: {:.0f} ops/sec, baseline {:.0f}'.format(
+                name, now['ops'], was['ops'] * scale))
+        for key in ('objects', 'bytes'):
+            if (now[key] > was[key]):
+                regressions.append('{}: {} {}, baseline {}'.format(
+                    name, now[key], key, was[key]))
+    return regressions, slowdowns